@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+import aiohttp
+import discord
+
+#One-shot import of the tickets that only exist as embeds in the ticket channel
+#Pages through the channel history newest to oldest, parses every ticket embed and writes each page in bulk:
+#open/claimed tickets go into the ticket store (so the bot tracks them), everything goes into the search index.
+#Progress is checkpointed after every page, so an interrupted run picks up where it stopped.
+#The bot has to be stopped first, it rewrites tickets.jsonl from memory and would drop the imported tickets (enforced with main.ticket_store_lock).
+#Run `python backfill.py --help`, use --recording to run against a recorded channel instead of Discord.
+
+class RateInfo:
+    def __init__(self, remaining: int = None, reset_after: float = None, retry_after: float = None):
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+#Reads the channel through the REST API directly, so the rate limit headers are visible
+class DiscordHistorySource:
+    API = "https://discord.com/api/v10"
+
+    def __init__(self, token: str, channel_id: int, record_path: str = None):
+        self.token = token
+        self.channel_id = channel_id
+        self.record_path = record_path
+        self._session = None
+
+    async def page(self, before: int, limit: int):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers={"Authorization": f"Bot {self.token}", "User-Agent": "DiscordBot (pro-tonn bug report backfill, 1.0)"})
+        params = {"limit": limit}
+        if before is not None:
+            params["before"] = before
+        async with self._session.get(f"{self.API}/channels/{self.channel_id}/messages", params=params) as response:
+            headers = response.headers
+            info = RateInfo(
+                remaining=int(headers["X-RateLimit-Remaining"]) if "X-RateLimit-Remaining" in headers else None,
+                reset_after=float(headers["X-RateLimit-Reset-After"]) if "X-RateLimit-Reset-After" in headers else None,
+            )
+            if response.status == 429:
+                body = await response.json()
+                info.retry_after = float(body.get("retry_after", info.reset_after or 1.0))
+                return None, info
+            response.raise_for_status()
+            messages = await response.json()
+        if self.record_path:
+            with open(self.record_path, "a") as f:
+                for message in messages:
+                    f.write(json.dumps(message, separators=(",", ":")) + "\n")
+        return messages, info
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+#Replays a recording (one raw message payload per line, newest first, as written by --record) and fakes the
+#rate limit headers of a bucket_size requests per reset_after seconds bucket, with an optional 429 every few pages
+class RecordedHistorySource:
+    def __init__(self, path: str, bucket_size: int = 5, reset_after: float = 1.0, fail_every: int = 0):
+        self.path = path
+        self.bucket_size = bucket_size
+        self.reset_after = reset_after
+        self.fail_every = fail_every
+        self.requests = 0
+        self._remaining = bucket_size
+        self._reset_at = 0.0
+        self._file = None
+
+    def _next(self):
+        for line in self._file:
+            if line.strip():
+                return json.loads(line)
+        return None
+
+    async def page(self, before: int, limit: int):
+        self.requests += 1
+        now = time.monotonic()
+        if now >= self._reset_at:
+            self._remaining, self._reset_at = self.bucket_size, now + self.reset_after
+        if self._remaining <= 0 or (self.fail_every and self.requests % self.fail_every == 0):
+            return None, RateInfo(0, self._reset_at - now, max(self._reset_at - now, 0.05))
+        self._remaining -= 1
+        if self._file is None:
+            self._file = open(self.path, "r")
+        #Stream forward to the first message older than `before`, nothing but the current page is kept in memory
+        messages = []
+        while len(messages) < limit:
+            message = self._next()
+            if message is None:
+                break
+            if before is not None and int(message["id"]) >= before:
+                continue
+            messages.append(message)
+        return messages, RateInfo(self._remaining, self._reset_at - now)
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+
+#Keeps requests under max_rps and waits out the bucket when the headers say it's empty
+class Pacer:
+    def __init__(self, max_rps: float = 2.0):
+        self.min_interval = 1 / max_rps if max_rps > 0 else 0
+        self.waited = 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+        self._next = time.monotonic() + self.min_interval
+
+    def update(self, info: RateInfo):
+        now = time.monotonic()
+        if info.retry_after is not None:
+            self._next = max(self._next, now + info.retry_after)
+        elif info.remaining is not None and info.remaining <= 0 and info.reset_after is not None:
+            self._next = max(self._next, now + info.reset_after)
+
+class Checkpoint:
+    def __init__(self, path: str, channel_id: int):
+        self.path = path
+        self.channel_id = channel_id
+
+    def load(self) -> dict:
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            if state.get("channel") == self.channel_id:
+                return state
+        return {"channel": self.channel_id, "before": None, "pages": 0, "scanned": 0, "imported": 0, "done": False}
+
+    def save(self, state: dict):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+#Just enough of discord.Message for main.record_from_message/details_from_message
+class PayloadMessage:
+    def __init__(self, payload: dict, guild_id: int):
+        self.id = int(payload["id"])
+        self.channel_id = int(payload["channel_id"])
+        self.embeds = [discord.Embed.from_dict(embed) for embed in payload.get("embeds", [])]
+        self.jump_url = f"https://discord.com/channels/{guild_id}/{self.channel_id}/{self.id}"
+        self.created_at = discord.utils.snowflake_time(self.id)
+
+def import_page(main, payloads: list, guild_id: int) -> int:
+    new_records = []
+    index_only = []
+    for payload in payloads:
+        message = PayloadMessage(payload, guild_id)
+        record = main.record_from_message(message)
+        if record is None:
+            continue
+        details = main.details_from_message(message)
+        live = main.ticket_store.get(record.message_id)
+        if live is not None:
+            #Records written by the bot are newer than the embed, only fill in the ticket text
+            index_only.append((live, details))
+        elif record.state in main.OPEN_STATES:
+            new_records.append((record, details))
+        else:
+            #Finished tickets are only needed for search, keeping them out of the store keeps the bot's memory flat
+            index_only.append((record, details))
+    if new_records:
+        main.ticket_store.put_many(new_records)
+    if index_only:
+        main.search_index.upsert_many(index_only)
+    return len(new_records) + len(index_only)
+
+async def backfill(main, source, checkpoint: Checkpoint, pacer: Pacer, guild_id: int, page_size: int = 100, log=print) -> dict:
+    state = checkpoint.load()
+    if state["done"]:
+        log(f"Channel {checkpoint.channel_id} was already backfilled, use --reset to run again")
+        return state
+    if state["before"] is not None:
+        log(f"Resuming after {state['pages']} page(s), {state['imported']} ticket(s) imported so far")
+    while True:
+        await pacer.wait()
+        payloads, info = await source.page(state["before"], page_size)
+        pacer.update(info)
+        if payloads is None:
+            log(f"Rate limited, retrying in {info.retry_after:.2f}s")
+            continue
+        if payloads:
+            imported = import_page(main, payloads, guild_id)
+            state["before"] = min(int(payload["id"]) for payload in payloads)
+            state["pages"] += 1
+            state["scanned"] += len(payloads)
+            state["imported"] += imported
+        state["done"] = len(payloads) < page_size
+        checkpoint.save(state)
+        if state["pages"] % 10 == 0 or state["done"]:
+            log(f"{state['pages']} page(s), {state['scanned']} message(s) scanned, {state['imported']} ticket(s) imported")
+        if state["done"]:
+            return state
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import existing tickets from the ticket channel history into the local ticket store and search index. Stop the bot first.")
+    parser.add_argument("--channel", type=int, help="channel to crawl, defaults to mainChannel from data.json")
+    parser.add_argument("--recording", help="replay this recording instead of calling Discord")
+    parser.add_argument("--record", help="also save every crawled message payload to this file, for replaying later")
+    parser.add_argument("--page-size", type=int, default=100, help="messages per request, at most 100")
+    parser.add_argument("--max-rps", type=float, default=2.0, help="upper bound on requests per second, on top of the rate limit headers")
+    parser.add_argument("--checkpoint", help="checkpoint file, defaults to backfill.checkpoint.json next to data.json")
+    parser.add_argument("--reset", action="store_true", help="forget the checkpoint and start from the newest message")
+    return parser.parse_args(argv)
+
+async def run(args):
+    import main
+    main.pCoreLogger.setLevel(logging.WARNING)
+    if not main.ticket_store_lock.acquire():
+        raise SystemExit(f"The bot is running, stop it before backfilling: it would overwrite the imported tickets when it compacts {main.ticket_store_path}")
+    #The bot may have written to the store between importing main and taking the lock
+    main.ticket_store.load()
+    channel_id = args.channel or main.main_channel
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(main.data_dir, "backfill.checkpoint.json"), channel_id)
+    if args.reset:
+        checkpoint.reset()
+    if args.recording:
+        source = RecordedHistorySource(args.recording)
+    else:
+        source = DiscordHistorySource(os.getenv("TOKEN"), channel_id, record_path=args.record)
+    try:
+        state = await backfill(main, source, checkpoint, Pacer(args.max_rps), main.main_guild, min(max(args.page_size, 1), 100))
+    finally:
+        await source.close()
+        main.search_index.close()
+        main.ticket_store_lock.release()
+    print(f"Done: {state['scanned']} message(s) scanned, {state['imported']} ticket(s) imported")
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,236 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from functools import wraps
+from collections import defaultdict
+from fake_discord import FakeRest, FakeClient, FakeInteraction
+
+#Load simulation for the ticket handlers against fake_discord, nothing here talks to Discord
+#Run with `python bench.py --help` for the knobs. Times are reported in simulated milliseconds (real time / --time-scale)
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+class Timings:
+    def __init__(self, scale: float):
+        self.scale = scale
+        self.samples = defaultdict(list)
+        self.failures = defaultdict(int)
+
+    def add(self, name: str, seconds: float):
+        self.samples[name].append(seconds / self.scale * 1000)
+
+    async def time(self, name: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def wrap(self, name: str, func):
+        @wraps(func)
+        async def wrapped(*args, **kwargs):
+            return await self.time(name, func(*args, **kwargs))
+        return wrapped
+
+    def summary(self) -> dict:
+        return {
+            name: {
+                "count": len(samples),
+                "p50": percentile(samples, 50),
+                "p90": percentile(samples, 90),
+                "p99": percentile(samples, 99),
+                "max": max(samples),
+            }
+            for name, samples in sorted(self.samples.items())
+        }
+
+def import_main(workdir: str, verbose: bool = False):
+    #main.py keeps data.json and its state files in the working directory
+    os.chdir(workdir)
+    import main
+    #Failed interactions are counted in the report, their tracebacks only show up with --verbose
+    main.pCoreLogger.setLevel(logging.INFO if verbose else logging.CRITICAL)
+    return main
+
+def fill_modal(modal, fields: dict):
+    for name, value in fields.items():
+        getattr(modal, name)._value = value
+
+async def run_tickets(main, client: FakeClient, args, timings: Timings):
+    scale = args.time_scale
+    main.tracker_writer.flush_interval = args.flush_interval * scale
+    main.step_timeout = main.step_timeout * scale
+    outbox = main.notification_outbox
+    outbox.dm_interval, outbox.user_interval, outbox.retry_delay = outbox.dm_interval * scale, outbox.user_interval * scale, outbox.retry_delay * scale
+    ticket_channel = client.channels[main.main_channel]
+    moderators = [client.add_user(f"moderator{i}", manage_guild=True) for i in range(args.moderators)]
+    rng = random.Random(args.seed)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    #discord.py routes every press to the one persistent view registered at on_ready
+    view = main.ticket_buttons()
+    failures = timings.failures
+
+    async def press(name: str, handler, interaction: FakeInteraction):
+        await timings.time(name, handler(interaction))
+        if interaction.acknowledged_at is not None:
+            timings.add(f"ack {name}", interaction.acknowledged_at - interaction.created_at)
+        if any(isinstance(sent, main.StepFailed) for sent in interaction.sent):
+            failures[name] += 1
+
+    async def sequence(number: int):
+        async with semaphore:
+            reporter = client.add_user(f"reporter{number}")
+            interaction = FakeInteraction(client, reporter)
+            await press("/ticket", main.ticket_bug_report.callback, interaction)
+            modal = interaction.modal
+            fill_modal(modal, {"title_": f"Bug #{number}", "bug": "Something broke " * 8, "impacted": "pro-tonn bot", "notes": ""})
+            await press("modal submit", modal.on_submit, FakeInteraction(client, reporter))
+            ticket = ticket_channel.find_by_footer(str(reporter.id))
+            if ticket is None:
+                #The submit timed out before the ticket was posted
+                return
+            moderator = rng.choice(moderators)
+            await press("claim", view.claim.callback, FakeInteraction(client, moderator, ticket))
+            if rng.random() < args.close_ratio:
+                interaction = FakeInteraction(client, moderator, ticket)
+                await press("close", view.close.callback, interaction)
+                modal = interaction.modal
+                if modal is None:
+                    #The claim didn't go through, so there's nothing to close
+                    return
+                fill_modal(modal, {"reason": "Duplicate"})
+                await press("close submit", modal.on_submit, FakeInteraction(client, moderator, ticket))
+            else:
+                await press("resolved", view.resolved.callback, FakeInteraction(client, moderator, ticket))
+
+    await asyncio.gather(*(sequence(number) for number in range(args.tickets)))
+    await timings.time("tracker flush", main.tracker_writer.close())
+    await timings.time("outbox drain", main.notification_outbox.drain())
+    await main.notification_outbox.close()
+
+def bench_rate_limit_backend(main, name: str):
+    if name != "redis":
+        return main.create_rate_limit_backend(name)
+    #Runs the real Lua script against an in-process Redis, no server needed
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("--rate-limit-backend redis needs fakeredis with Lua support, install it with `pip install fakeredis[lua]`")
+    return main.RedisRateLimitBackend(fakeredis.aioredis.FakeRedis())
+
+async def run_rate_limit(main, args, timings: Timings):
+    backend = bench_rate_limit_backend(main, args.rate_limit_backend)
+    limiter = main.RateLimit(times=1, seconds=180, backend=backend)
+    limiter.name = "bench"
+    rejected = 0
+    for number in range(args.rate_limit_checks):
+        start = time.perf_counter()
+        rejected += await limiter.check(number % args.rate_limit_users) > 0
+        #Reported in real microseconds, the backends don't go through the simulated REST layer
+        timings.samples["RateLimit.check (us)"].append((time.perf_counter() - start) * 1e6)
+    await backend.close()
+    return rejected
+
+async def bench(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="protonn-bench-")
+    main = import_main(workdir, args.verbose)
+    scale = args.time_scale
+    rest = FakeRest(
+        latency=args.latency_ms / 1000 * scale,
+        jitter=args.jitter_ms / 1000 * scale,
+        bucket_size=args.bucket_size,
+        bucket_window=args.bucket_window_ms / 1000 * scale,
+        random_429_rate=args.random_429_rate,
+        retry_after=args.retry_after_ms / 1000 * scale,
+        seed=args.seed,
+    )
+    client = FakeClient(rest, main.main_guild, gateway_cache=not args.cold_cache)
+    client.add_channel(main.main_channel)
+    client.add_channel(main.tracking_channel)
+    main.client = client
+    timings = Timings(scale)
+    main.track_ticket = timings.wrap("track_ticket", main.track_ticket)
+    main.check_claimed = timings.wrap("check_claimed", main.check_claimed)
+
+    if not args.no_tracemalloc:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await timings.time("startup (ticket index)", main.ticket_index.build())
+    main.notification_outbox.start()
+    await run_tickets(main, client, args, timings)
+    elapsed = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    tracemalloc.stop()
+    rejected = await run_rate_limit(main, args, timings) if args.rate_limit_checks else 0
+
+    return {
+        "tickets": args.tickets,
+        "elapsed_simulated_s": elapsed / scale,
+        "rest_calls": rest.total_calls,
+        "rest_calls_per_ticket": rest.total_calls / args.tickets,
+        "rest_calls_by_route": dict(rest.calls.most_common()),
+        "rate_limited_by_route": dict(rest.rate_limited.most_common()),
+        "tracker_edits_saved": main.tracker_writer.edits_saved,
+        "dms_delivered": main.notification_outbox.delivered,
+        "rate_limit_rejections": rejected,
+        "peak_memory_bytes": peak_memory,
+        "failed_interactions": dict(timings.failures),
+        "handlers": timings.summary(),
+    }
+
+def print_report(result: dict):
+    print(f"\n{result['tickets']} tickets in {result['elapsed_simulated_s']:.1f}s simulated")
+    print(f"REST calls: {result['rest_calls']} ({result['rest_calls_per_ticket']:.2f} per ticket), tracker edits saved: {result['tracker_edits_saved']}, DMs delivered: {result['dms_delivered']}")
+    for route, calls in result["rest_calls_by_route"].items():
+        print(f"  {calls:>8}  {route}  ({result['rate_limited_by_route'].get(route, 0)} rate limited)")
+    if result["failed_interactions"]:
+        print(f"Failed interactions (step timeouts/errors): {result['failed_interactions']}")
+    if result["peak_memory_bytes"] is not None:
+        print(f"Peak traced memory: {result['peak_memory_bytes'] / 1024 / 1024:.2f} MiB")
+    print(f"\n{'handler':<26}{'count':>8}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for name, stats in result["handlers"].items():
+        print(f"{name:<26}{stats['count']:>8}{stats['p50']:>10.1f}{stats['p90']:>10.1f}{stats['p99']:>10.1f}{stats['max']:>10.1f}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay ticket submit/claim/resolve/close sequences against a fake Discord")
+    parser.add_argument("--tickets", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50, help="ticket sequences in flight at once")
+    parser.add_argument("--moderators", type=int, default=5)
+    parser.add_argument("--close-ratio", type=float, default=0.3, help="share of tickets closed instead of resolved")
+    parser.add_argument("--latency-ms", type=float, default=80, help="simulated REST latency")
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--bucket-size", type=int, default=5, help="requests per route bucket per window")
+    parser.add_argument("--bucket-window-ms", type=float, default=5000)
+    parser.add_argument("--random-429-rate", type=float, default=0.0, help="chance of an extra 429 on any rate limited request")
+    parser.add_argument("--retry-after-ms", type=float, default=1000)
+    parser.add_argument("--flush-interval", type=float, default=2.0, help="tracker writer flush interval in simulated seconds")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="real seconds per simulated second")
+    parser.add_argument("--cold-cache", action="store_true", help="pretend the gateway cache is empty so get_* always misses")
+    parser.add_argument("--rate-limit-backend", default="memory", choices=("memory", "sqlite", "redis"), help="redis runs against fakeredis")
+    parser.add_argument("--rate-limit-checks", type=int, default=100000)
+    parser.add_argument("--rate-limit-users", type=int, default=5000)
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip memory tracing, it slows everything down")
+    parser.add_argument("--verbose", action="store_true", help="log everything main.py logs, including failed interactions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    json_path = os.path.abspath(args.json) if args.json else None
+    result = asyncio.run(bench(args))
+    print_report(result)
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(result, f, indent=2)
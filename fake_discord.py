@@ -0,0 +1,223 @@
+import time
+import random
+import asyncio
+import discord
+import itertools
+from collections import Counter
+
+#In-process stand-in for the parts of discord.py the bot touches, used by bench.py
+#Every REST call goes through FakeRest, which adds latency, per route buckets and 429s
+
+_snowflakes = itertools.count(1 << 50)
+
+def next_snowflake() -> int:
+    return next(_snowflakes)
+
+class FakeRest:
+    def __init__(self, latency: float = 0.04, jitter: float = 0.02, bucket_size: int = 5, bucket_window: float = 5.0, random_429_rate: float = 0.0, retry_after: float = 1.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.bucket_size = bucket_size
+        self.bucket_window = bucket_window
+        self.random_429_rate = random_429_rate
+        self.retry_after = retry_after
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self._buckets = {}
+        self._random = random.Random(seed)
+
+    async def request(self, route: str, major: int = 0, limited: bool = True):
+        #Like discord.py, a 429 is waited out and retried, so the caller only sees the extra time
+        self.calls[route] += 1
+        while limited:
+            wait = self._reserve(route, major)
+            if wait <= 0 and self._random.random() >= self.random_429_rate:
+                break
+            self.rate_limited[route] += 1
+            await asyncio.sleep(wait if wait > 0 else self.retry_after)
+        await asyncio.sleep(max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _reserve(self, route: str, major: int) -> float:
+        now = time.monotonic()
+        key = (route, major)
+        reset, remaining = self._buckets.get(key, (now + self.bucket_window, self.bucket_size))
+        if now >= reset:
+            reset, remaining = now + self.bucket_window, self.bucket_size
+        if remaining <= 0:
+            self._buckets[key] = (reset, remaining)
+            return reset - now
+        self._buckets[key] = (reset, remaining - 1)
+        return 0
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+class FakeAsset:
+    def __init__(self, url: str):
+        self.url = url
+
+class FakeUser:
+    def __init__(self, client: "FakeClient", user_id: int, name: str, manage_guild: bool = False):
+        self._client = client
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{user_id}>"
+        self.avatar = FakeAsset(f"https://cdn.discordapp.com/avatars/{user_id}/fake.png")
+        self.guild_permissions = discord.Permissions(manage_guild=manage_guild)
+        self.dms = []
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    async def send(self, content=None, **kwargs):
+        await self._client.rest.request("POST /users/@me/channels", limited=False)
+        await self._client.rest.request("POST /channels/{channel_id}/messages", self.id)
+        self.dms.append(content)
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", author: FakeUser, embed=None, view=None, content=None):
+        self.channel = channel
+        self.id = next_snowflake()
+        self.author = author
+        self.content = content
+        self.embeds = [embed] if embed is not None else []
+        self.view = view
+        self.created_at = discord.utils.utcnow()
+
+    @property
+    def jump_url(self) -> str:
+        return f"https://discord.com/channels/{self.channel.guild_id}/{self.channel.id}/{self.id}"
+
+    async def edit(self, embed=None, view=None, **kwargs):
+        await self.channel.client.rest.request("PATCH /channels/{channel_id}/messages/{message_id}", self.channel.id)
+        if embed is not None:
+            self.embeds = [discord.Embed.from_dict(embed.to_dict())]
+        if view is not None:
+            self.view = view
+        return self
+
+class FakePartialMessage:
+    def __init__(self, channel: "FakeChannel", message_id: int):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        return await self.channel.messages[self.id].edit(**kwargs)
+
+class FakeChannel:
+    def __init__(self, client: "FakeClient", channel_id: int, guild_id: int):
+        self.client = client
+        self.id = channel_id
+        self.guild_id = guild_id
+        self.messages = {}
+        self._by_footer = {}
+
+    def find_by_footer(self, text: str):
+        return self._by_footer.get(text)
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await self.client.rest.request("POST /channels/{channel_id}/messages", self.id)
+        message = FakeMessage(self, self.client.user, embed=embed, view=view, content=content)
+        if embed is not None:
+            message.embeds = [discord.Embed.from_dict(embed.to_dict())]
+        self.messages[message.id] = message
+        if message.embeds and message.embeds[0].footer.text:
+            self._by_footer[message.embeds[0].footer.text] = message
+        return message
+
+    def get_partial_message(self, message_id: int):
+        return FakePartialMessage(self, message_id)
+
+    async def history(self, limit=100, oldest_first=False, **kwargs):
+        messages = sorted(self.messages.values(), key=lambda message: message.id, reverse=not oldest_first)
+        if limit is not None:
+            messages = messages[:limit]
+        for index, message in enumerate(messages):
+            if index % 100 == 0:
+                await self.client.rest.request("GET /channels/{channel_id}/messages", self.id)
+            yield message
+
+class FakeClient:
+    def __init__(self, rest: FakeRest, guild_id: int, gateway_cache: bool = True):
+        self.rest = rest
+        self.guild_id = guild_id
+        self.gateway_cache = gateway_cache
+        self.user = FakeUser(self, next_snowflake(), "Pro-tonn Bug Report")
+        self.channels = {}
+        self.users = {}
+
+    def add_channel(self, channel_id: int) -> FakeChannel:
+        self.channels[channel_id] = FakeChannel(self, channel_id, self.guild_id)
+        return self.channels[channel_id]
+
+    def add_user(self, name: str, manage_guild: bool = False) -> FakeUser:
+        user = FakeUser(self, next_snowflake(), name, manage_guild)
+        self.users[user.id] = user
+        return user
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id) if self.gateway_cache else None
+
+    def get_user(self, user_id: int):
+        return self.users.get(user_id) if self.gateway_cache else None
+
+    async def fetch_channel(self, channel_id: int):
+        await self.rest.request("GET /channels/{channel_id}", channel_id)
+        return self.channels[channel_id]
+
+    async def fetch_user(self, user_id: int):
+        await self.rest.request("GET /users/{user_id}")
+        return self.users[user_id]
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self._interaction.client.rest.request("POST /webhooks/{application_id}/{interaction_token}", limited=False)
+        self._interaction.sent.append(content if content is not None else kwargs.get("embed"))
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        self._interaction.acknowledged_at = time.perf_counter()
+        await self._interaction.client.rest.request("POST /interactions/{interaction_id}/{interaction_token}/callback", limited=False)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond()
+        self._interaction.sent.append(content if content is not None else kwargs.get("embed"))
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+    async def send_modal(self, modal):
+        await self._respond()
+        self._interaction.modal = modal
+
+class FakeInteraction:
+    def __init__(self, client: FakeClient, user: FakeUser, message: FakeMessage = None):
+        self.client = client
+        self.id = next_snowflake()
+        self.user = user
+        self.message = message
+        self.guild_id = client.guild_id
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.sent = []
+        self.modal = None
+        self.created_at = time.perf_counter()
+        self.acknowledged_at = None
@@ -1,13 +1,24 @@
 import os
+import re
 import sys
 import time
 import json
+import hashlib
+import math
+import random
 import typing
+import contextlib
 import asyncio
+import sqlite3
+import secrets
+import threading
 import discord
 import logging
+import bisect
 from typing import Dict
 from functools import wraps
+from collections import OrderedDict, deque, Counter
+from aiohttp import web
 from datetime import datetime
 from dotenv import load_dotenv
 from discord import app_commands, ui
@@ -89,59 +100,340 @@ else:
         main_guild = data["mainGuild"]
         main_channel = data["mainChannel"]
         tracking_channel = data["trackingChannel"]
+#Seconds the tracking message writer waits to batch ticket events into a single edit
+tracker_flush_interval = float(data.get("trackerFlushInterval", 2.0))
+#Fetched users/channels are kept for cacheTTL seconds, at most cacheSize of each
+cache_ttl = float(data.get("cacheTTL", 300))
+cache_size = int(data.get("cacheSize", 1024))
+#Local state files are kept next to data.json
+data_dir = os.path.dirname(os.path.abspath("data.json"))
+ticket_store_path = os.path.join(data_dir, "tickets.jsonl")
+ticket_index_db_path = os.path.join(data_dir, "tickets.db")
+command_hash_path = os.path.join(data_dir, "command_tree.sha256")
+#Reporter DMs that could not be delivered yet, retried on the next start
+outbox_journal_path = os.path.join(data_dir, "outbox.jsonl")
+outbox_workers = int(data.get("dmWorkers", 2))
+#Longest a handler waits for startup warm up before doing the work itself
+warm_up_timeout = float(data.get("warmUpTimeout", 10))
+#Longest a single REST step of an interaction handler may take before the handler gives up
+step_timeout = float(data.get("stepTimeout", 10))
+#Where rate limit state lives: "memory", "sqlite" (rateLimitPath) or "redis" (REDIS_URL in .env)
+rate_limit_backend_name = data.get("rateLimitBackend", "memory")
+rate_limit_path = os.path.join(data_dir, data.get("rateLimitPath", "ratelimit.db"))
+#Instrumentation can be switched off entirely with metricsEnabled, metricsPort 0 only disables the HTTP endpoint
+metrics_enabled = bool(data.get("metricsEnabled", True))
+metrics_port = int(data.get("metricsPort", 9108))
+#Only read at startup, /restart reload warns when they changed instead of applying them
+STARTUP_ONLY_SETTINGS = ("mainGuild", "dmWorkers", "rateLimitBackend", "rateLimitPath", "metricsEnabled", "metricsPort")
+startup_settings = {key: data.get(key) for key in STARTUP_ONLY_SETTINGS}
+
+#METRICS
+#Handler timings, outbound REST calls and rate limit rejections, served in the Prometheus text format
+class Metrics:
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        #handler -> [bucket counts..., +Inf count, sum, max]
+        self.timings: Dict[str, list] = {}
+        self.rest_calls = Counter()
+        self.rest_errors = Counter()
+        self.rate_limit_rejections = Counter()
+        self.gauges: Dict[str, typing.Callable[[], float]] = {}
+        self._runner = None
+
+    def observe(self, name: str, seconds: float):
+        entry = self.timings.get(name)
+        if entry is None:
+            entry = self.timings[name] = [0] * (len(self.BUCKETS) + 1) + [0.0, 0.0]
+        entry[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        entry[-2] += seconds
+        if seconds > entry[-1]:
+            entry[-1] = seconds
+
+    def timed(self, name: str):
+        def decorator(func):
+            #Disabled metrics leave the function untouched, so there's no overhead at all
+            if not self.enabled:
+                return func
+            @wraps(func)
+            async def wrapped(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapped
+        return decorator
+
+    def instrument_http(self, http):
+        if not self.enabled:
+            return
+        request = http.request
+        async def counted_request(route, **kwargs):
+            #route.path is the template (e.g. /channels/{channel_id}/messages) so the label stays low cardinality
+            key = f"{route.method} {route.path}"
+            self.rest_calls[key] += 1
+            try:
+                return await request(route, **kwargs)
+            except discord.HTTPException as e:
+                self.rest_errors[(key, e.status)] += 1
+                raise
+        http.request = counted_request
+
+    def reject(self, command: str):
+        if self.enabled:
+            self.rate_limit_rejections[command] += 1
+
+    def gauge(self, name: str, func: typing.Callable[[], float]):
+        self.gauges[name] = func
+
+    @staticmethod
+    def _label(value) -> str:
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+    def render(self) -> str:
+        lines = [
+            "# HELP protonn_handler_seconds Time spent in bot handlers",
+            "# TYPE protonn_handler_seconds histogram",
+        ]
+        for name, entry in sorted(self.timings.items()):
+            label = self._label(name)
+            cumulative = 0
+            for bound, count in zip(self.BUCKETS, entry):
+                cumulative += count
+                lines.append(f'protonn_handler_seconds_bucket{{handler="{label}",le="{bound}"}} {cumulative}')
+            cumulative += entry[len(self.BUCKETS)]
+            lines.append(f'protonn_handler_seconds_bucket{{handler="{label}",le="+Inf"}} {cumulative}')
+            lines.append(f'protonn_handler_seconds_sum{{handler="{label}"}} {entry[-2]}')
+            lines.append(f'protonn_handler_seconds_count{{handler="{label}"}} {cumulative}')
+        lines += ["# HELP protonn_rest_requests_total Outbound Discord REST requests", "# TYPE protonn_rest_requests_total counter"]
+        for route, count in sorted(self.rest_calls.items()):
+            lines.append(f'protonn_rest_requests_total{{route="{self._label(route)}"}} {count}')
+        lines += ["# HELP protonn_rest_errors_total Failed outbound Discord REST requests", "# TYPE protonn_rest_errors_total counter"]
+        for (route, status), count in sorted(self.rest_errors.items()):
+            lines.append(f'protonn_rest_errors_total{{route="{self._label(route)}",status="{status}"}} {count}')
+        lines += ["# HELP protonn_ratelimit_rejections_total Commands rejected by RateLimit", "# TYPE protonn_ratelimit_rejections_total counter"]
+        for command, count in sorted(self.rate_limit_rejections.items()):
+            lines.append(f'protonn_ratelimit_rejections_total{{command="{self._label(command)}"}} {count}')
+        for name, func in sorted(self.gauges.items()):
+            try:
+                value = float(func())
+            except Exception:
+                continue
+            if math.isfinite(value):
+                lines += [f"# TYPE protonn_{name} gauge", f"protonn_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    async def start_server(self, port: int, host: str = "127.0.0.1"):
+        if not self.enabled or not port or self._runner is not None:
+            return
+        async def handle(request):
+            #Prometheus text exposition format 0.0.4
+            return web.Response(body=self.render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except OSError as e:
+            #Usually another bot process already serves this port, the bot itself works fine without the endpoint
+            pCoreLogger.warning(f"Can't serve metrics on {host}:{port} ({e}), continuing without the metrics endpoint")
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        pCoreLogger.info(f"Metrics served on http://{host}:{port}/metrics")
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+metrics = Metrics(enabled=metrics_enabled)
+
+#RATE LIMIT BACKENDS
+#Every backend has one call, hit(), which checks and records a use in a single round-trip.
+#It returns 0 if the use was allowed (and recorded), otherwise the seconds left. Exempt uses are always recorded.
+class MemoryRateLimitBackend:
+    def __init__(self, max_users: int = 10000):
+        self.max_users = max_users
+        self._windows: typing.OrderedDict[str, typing.Deque[float]] = OrderedDict()
+
+    def clock(self) -> float:
+        return time.monotonic()
+
+    async def hit(self, key: str, times: int, seconds: float, exempt: bool = False, now: typing.Optional[float] = None) -> float:
+        now = self.clock() if now is None else now
+        window = self._windows.get(key)
+        if window is None:
+            window = deque(maxlen=times)
+            self._windows[key] = window
+            #Least recently seen users go first, anyone evicted had the oldest timestamps anyway
+            while len(self._windows) > self.max_users:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(key)
+        while window and now - window[0] >= seconds:
+            window.popleft()
+        time_left = seconds - (now - window[0]) if len(window) >= times else 0
+        if time_left <= 0 or exempt:
+            window.append(now)
+        return max(time_left, 0)
+
+    async def close(self):
+        self._windows.clear()
+
+#Survives restarts and can be shared by several processes on the same machine
+class SQLiteRateLimitBackend:
+    def __init__(self, path: str, max_window: float = 3600):
+        self.path = path
+        self.max_window = max_window
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS ratelimit (key TEXT NOT NULL, ts REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS ratelimit_key_ts ON ratelimit (key, ts)")
+
+    def clock(self) -> float:
+        #Wall clock, monotonic time doesn't mean anything to another process or after a restart
+        return time.time()
+
+    def _hit(self, key: str, times: int, seconds: float, exempt: bool, now: float) -> float:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM ratelimit WHERE key = ? AND ts <= ?", (key, now - seconds))
+                #The window frees up when the times-th most recent use expires
+                row = self._db.execute("SELECT ts FROM ratelimit WHERE key = ? ORDER BY ts DESC LIMIT 1 OFFSET ?", (key, times - 1)).fetchone()
+                time_left = seconds - (now - row[0]) if row is not None else 0
+                if time_left <= 0 or exempt:
+                    self._db.execute("INSERT INTO ratelimit (key, ts) VALUES (?, ?)", (key, now))
+                self._hits += 1
+                if self._hits % 1000 == 0:
+                    #Users that never come back would otherwise stay forever
+                    self._db.execute("DELETE FROM ratelimit WHERE ts <= ?", (now - self.max_window,))
+                self._db.execute("COMMIT")
+            except Exception:
+                #A failed COMMIT can end the transaction on its own, a second error here would hide the first
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+        return max(time_left, 0)
+
+    async def hit(self, key: str, times: int, seconds: float, exempt: bool = False, now: typing.Optional[float] = None) -> float:
+        return await asyncio.to_thread(self._hit, key, times, seconds, exempt, self.clock() if now is None else now)
+
+    async def close(self):
+        with self._lock:
+            self._db.close()
+
+#Sliding window on a sorted set per key, checked and recorded in one EVAL
+#Takes any client with a redis.asyncio style eval(), so a local stand-in (e.g. fakeredis) works for testing
+class RedisRateLimitBackend:
+    SCRIPT = """
+    local key, now, seconds, times, exempt, member = KEYS[1], tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4] == "1", ARGV[5]
+    redis.call("ZREMRANGEBYSCORE", key, "-inf", now - seconds)
+    local time_left = 0
+    local limiting = redis.call("ZRANGE", key, -times, -times, "WITHSCORES")
+    if redis.call("ZCARD", key) >= times then
+        time_left = seconds - (now - tonumber(limiting[2]))
+    end
+    if time_left <= 0 or exempt then
+        redis.call("ZADD", key, now, member)
+        redis.call("EXPIRE", key, math.ceil(seconds))
+    end
+    return tostring(time_left)
+    """
+
+    def __init__(self, redis_client, prefix: str = "protonn:ratelimit:"):
+        self.redis = redis_client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str):
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError("The redis rate limit backend needs the redis package, install it with `pip install redis`")
+        return cls(redis.asyncio.from_url(url))
+
+    def clock(self) -> float:
+        return time.time()
+
+    async def hit(self, key: str, times: int, seconds: float, exempt: bool = False, now: typing.Optional[float] = None) -> float:
+        now = self.clock() if now is None else now
+        member = f"{now}:{secrets.token_hex(4)}"
+        time_left = await self.redis.eval(self.SCRIPT, 1, self.prefix + key, now, seconds, times, "1" if exempt else "0", member)
+        if isinstance(time_left, bytes):
+            time_left = time_left.decode()
+        return max(float(time_left), 0)
+
+    async def close(self):
+        close = getattr(self.redis, "aclose", None) or getattr(self.redis, "close", None)
+        if close is not None:
+            await close()
+
+def create_rate_limit_backend(name: str):
+    if name == "sqlite":
+        return SQLiteRateLimitBackend(rate_limit_path)
+    elif name == "redis":
+        return RedisRateLimitBackend.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    elif name == "memory":
+        return MemoryRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend {name!r}, expected memory, sqlite or redis")
+
+rate_limit_backend = create_rate_limit_backend(rate_limit_backend_name)
 
 #Custom rate limit made by frozenpirate, modified by me
+#Sliding window per user, kept in a pluggable backend (in memory by default)
 class RateLimit:
-    def __init__(self, times: int = 1, seconds: int = 5, ephemeral: bool = True, ignoreManageGuildPermission: bool = False):
+    _instances: typing.List["RateLimit"] = []
+
+    def __init__(self, times: int = 1, seconds: int = 5, ephemeral: bool = True, ignoreManageGuildPermission: bool = False, backend = None):
         self.times = times
         self.seconds = seconds
         self.ephemeral = ephemeral
         self.ignoreAdmin = ignoreManageGuildPermission
-        self._user_commands: Dict[int, list] = typing.DefaultDict(list)
-        self._cleanup_task = None
-    
-    async def _cleanup_old_entries(self):
-        while True:
-            current_time = datetime.now()
-            for user_id in list(self._user_commands.keys()):
-                self._user_commands[user_id] = [
-                    timestamp for timestamp in self._user_commands[user_id]
-                    if (current_time - timestamp).total_seconds() < self.seconds
-                ]
-                if not self._user_commands[user_id]:
-                    del self._user_commands[user_id]
-            await asyncio.sleep(self.seconds)
+        self.backend = backend if backend is not None else rate_limit_backend
+        self.name = None
+        RateLimit._instances.append(self)
+
+    async def check(self, user_id: int, exempt: bool = False, now: typing.Optional[float] = None) -> float:
+        #Returns 0 and records the use if the user is allowed, otherwise the seconds left until they are
+        return await self.backend.hit(f"{self.name}:{user_id}", self.times, self.seconds, exempt, now)
+
+    @classmethod
+    async def close_all(cls):
+        backends = {id(limiter.backend): limiter.backend for limiter in cls._instances}
+        cls._instances.clear()
+        for backend in backends.values():
+            await backend.close()
 
     def __call__(self, func):
+        self.name = self.name or func.__qualname__
+
         @wraps(func)
         async def wrapped(interaction: discord.Interaction, *args, **kwargs):
-            if self._cleanup_task is None:
-                self._cleanup_task = asyncio.create_task(self._cleanup_old_entries())
             pCoreLogger.debug("RateLimit decorator successfully executed")
 
-            current_time = datetime.now()
-            user_id = interaction.user.id
+            exempt = self.ignoreAdmin and interaction.user.guild_permissions.manage_guild
+            time_left = await self.check(interaction.user.id, exempt)
 
             # Check if user has exceeded rate limit
-            recent_commands = len([
-                t for t in self._user_commands[user_id]
-                if (current_time - t).total_seconds() < self.seconds
-            ])
-
-            if recent_commands >= self.times:
-                if self.ignoreAdmin and interaction.user.guild_permissions.manage_guild:
+            if time_left > 0:
+                if exempt:
                     pCoreLogger.debug(f"Ignoring user {interaction.user.name} with manage guild permissions")
-                    self._user_commands[user_id].append(current_time)
                     return await func(interaction, *args, **kwargs)
                 else:
-                    time_left = self.seconds - (current_time - min(self._user_commands[user_id])).seconds
+                    metrics.reject(self.name)
                     embed = discord.Embed(
                         title="Rate Limited",
-                        description=f"Please wait `{time_left}` seconds before using this command again.",
+                        description=f"Please wait `{math.ceil(time_left)}` seconds before using this command again.",
                         color=discord.Color.red()
                     )
                     return await interaction.response.send_message(embed=embed, ephemeral=self.ephemeral)
-            self._user_commands[user_id].append(current_time)
             return await func(interaction, *args, **kwargs)
 
         return wrapped
@@ -150,156 +442,1071 @@ class RateLimit:
 class aclient(discord.Client):
     def __init__(self):
         super().__init__(intents=discord.Intents.all())
-        self.synced = False
         self.added = False
-    
-    async def on_ready(self):
-        await self.wait_until_ready()
-        if not self.synced:
-            await tree.sync(guild=discord.Object(id=main_guild))
-            self.synced = True
+        self.warmed_up = asyncio.Event()
+        self._warm_up_task = None
+        metrics.instrument_http(self.http)
+
+    async def setup_hook(self):
+        #Persistent views only need their custom ids, so they can be registered before connecting
         if not self.added:
             self.add_view(ticket_buttons())
             self.added = True
+        metrics.gauge("gateway_latency_seconds", lambda: self.latency)
+        metrics.gauge("open_tickets", lambda: ticket_index.open_count)
+        metrics.gauge("tracker_edits_saved", lambda: tracker_writer.edits_saved)
+        for cache_name, cache in (("channel", channel_cache), ("user", user_cache)):
+            metrics.gauge(f"{cache_name}_cache_hit_ratio", lambda cache=cache: cache.stats()["hit_ratio"])
+            metrics.gauge(f"{cache_name}_cache_fetches", lambda cache=cache: cache.misses)
+        metrics.gauge("outbox_pending", lambda: notification_outbox.pending_count)
+        metrics.gauge("outbox_delivered", lambda: notification_outbox.delivered)
+        metrics.gauge("outbox_undeliverable", lambda: notification_outbox.undeliverable)
+        notification_outbox.start()
+        await metrics.start_server(metrics_port)
+    
+    async def on_ready(self):
+        #on_ready fires again after every reconnect, warm up only runs once and never blocks the event
+        if self._warm_up_task is None:
+            self.start_warm_up()
         pCoreLogger.info(f"Logged in as {self.user}")
+
+    def start_warm_up(self):
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            #A reload while the previous warm up is still running, its results are stale anyway
+            self._warm_up_task.cancel()
+        self.warmed_up.clear()
+        self._warm_up_task = asyncio.create_task(self.warm_up())
+
+    async def warm_up(self):
+        start = time.perf_counter()
+        steps = ("command sync", "channel cache", "ticket index")
+        results = await asyncio.gather(sync_command_tree(), channel_cache.get(main_channel), ticket_index.build(), return_exceptions=True)
+        for step, result in zip(steps, results):
+            if isinstance(result, Exception):
+                pCoreLogger.error(f"Warm up step {step} failed", exc_info=result)
+        self.warmed_up.set()
+        pCoreLogger.info(f"Warm up finished in {time.perf_counter() - start:.2f}s")
+
+    async def wait_warm(self, timeout: float = None) -> bool:
+        try:
+            await asyncio.wait_for(self.warmed_up.wait(), timeout if timeout is not None else warm_up_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close_state(self):
+        #Flushes and closes everything that keeps state in memory, before a shutdown or an execv restart
+        await notification_outbox.close()
+        await tracker_writer.close()
+        await RateLimit.close_all()
+        await metrics.close()
+        search_index.close()
+        pCoreLogger.info(f"Tracker closed, {tracker_writer.edits_saved} tracking edit(s) saved")
+        pCoreLogger.info(f"Channel cache: {channel_cache.stats()}, user cache: {user_cache.stats()}")
+
+    async def close(self):
+        await self.close_state()
+        await super().close()
     
 client = aclient()
 tree = app_commands.CommandTree(client)
 
+def command_tree_hash() -> str:
+    commands = sorted((command.to_dict() for command in tree.get_commands(guild=discord.Object(id=main_guild))), key=lambda command: command["name"])
+    return hashlib.sha256(json.dumps({"guild": main_guild, "commands": commands}, sort_keys=True).encode()).hexdigest()
+
+async def sync_command_tree() -> bool:
+    #Syncing is slow and rate limited, only do it when the commands actually changed since the last sync
+    tree_hash = command_tree_hash()
+    if os.path.isfile(command_hash_path):
+        with open(command_hash_path, "r") as f:
+            if f.read().strip() == tree_hash:
+                pCoreLogger.info("Command tree unchanged, skipping sync")
+                return False
+    await tree.sync(guild=discord.Object(id=main_guild))
+    with open(command_hash_path, "w") as f:
+        f.write(tree_hash)
+    pCoreLogger.info("Command tree synced")
+    return True
+
+async def reload_state() -> typing.List[str]:
+    #In-process restart: reloads data.json and the local state files and warms up again, keeping the gateway connection
+    #Returns the changed settings that still need a full restart
+    global main_channel, tracking_channel, tracker_flush_interval, cache_ttl, cache_size, warm_up_timeout, step_timeout
+    await tracker_writer.flush()
+    with open("data.json", "r") as f:
+        new_data = json.load(f)
+    needs_restart = [key for key in STARTUP_ONLY_SETTINGS if new_data.get(key) != startup_settings[key]]
+    if needs_restart:
+        pCoreLogger.warning(f"{', '.join(needs_restart)} changed in data.json, the old value(s) stay in use until a full restart")
+    data.clear()
+    data.update(new_data)
+    main_channel = new_data["mainChannel"]
+    tracking_channel = new_data["trackingChannel"]
+    tracker_flush_interval = float(new_data.get("trackerFlushInterval", 2.0))
+    cache_ttl = float(new_data.get("cacheTTL", 300))
+    cache_size = int(new_data.get("cacheSize", 1024))
+    warm_up_timeout = float(new_data.get("warmUpTimeout", 10))
+    step_timeout = float(new_data.get("stepTimeout", 10))
+    tracker_writer.flush_interval = tracker_flush_interval
+    tracker_writer.reset()
+    for cache in (channel_cache, user_cache):
+        cache.ttl, cache.max_size = cache_ttl, cache_size
+        cache.invalidate()
+    #Shards stored for another tracking channel are skipped when the index is built again (see TicketStore.shards_for)
+    ticket_store.load()
+    search_index.sync_from(ticket_store)
+    ticket_index.built = False
+    client.start_warm_up()
+    await client.wait_warm()
+    return needs_restart
+
+#Cache in front of client.fetch_*, tries the gateway cache (client.get_*) first and only one fetch per ID is in flight at a time
+class ObjectCache:
+    def __init__(self, getter: str, fetcher: str, max_size: int = 1024, ttl: float = 300):
+        self.getter = getter
+        self.fetcher = fetcher
+        self.max_size = max_size
+        self.ttl = ttl
+        self.gateway_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries: typing.OrderedDict[int, typing.Tuple[float, typing.Any]] = OrderedDict()
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    async def get(self, object_id: int):
+        obj = getattr(client, self.getter)(object_id)
+        if obj is not None:
+            self.gateway_hits += 1
+            return obj
+        entry = self._entries.get(object_id)
+        if entry is not None:
+            if time.monotonic() < entry[0]:
+                self._entries.move_to_end(object_id)
+                self.hits += 1
+                return entry[1]
+            del self._entries[object_id]
+        inflight = self._inflight.get(object_id)
+        if inflight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            #The fetch runs as its own task, so a caller that gets cancelled (e.g. by a step timeout) doesn't take it down for everyone waiting on it
+            inflight = self._inflight[object_id] = asyncio.create_task(self._fetch(object_id))
+            #Nobody may be left waiting, don't let asyncio complain about an unretrieved exception
+            inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return await asyncio.shield(inflight)
+
+    async def _fetch(self, object_id: int):
+        try:
+            obj = await getattr(client, self.fetcher)(object_id)
+            self._store(object_id, obj)
+            return obj
+        finally:
+            del self._inflight[object_id]
+
+    def _store(self, object_id: int, obj):
+        self._entries[object_id] = (time.monotonic() + self.ttl, obj)
+        self._entries.move_to_end(object_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, object_id: typing.Optional[int] = None):
+        if object_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(object_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.gateway_hits + self.hits + self.coalesced + self.misses
+        return {
+            "gateway_hits": self.gateway_hits,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "hit_ratio": (lookups - self.misses) / lookups if lookups else 0.0,
+        }
+
+channel_cache = ObjectCache("get_channel", "fetch_channel", max_size=cache_size, ttl=cache_ttl)
+user_cache = ObjectCache("get_user", "fetch_user", max_size=cache_size, ttl=cache_ttl)
+
+#TICKET STORE
+OPEN_STATES = ("open", "claimed")
+
+class TicketRecord:
+    __slots__ = ("message_id", "reporter", "title", "claimer", "state", "created", "updated", "jump_url")
+
+    def __init__(self, message_id: int, reporter: int, title: str, jump_url: str, claimer: typing.Optional[int] = None, state: str = "open", created: typing.Optional[int] = None, updated: typing.Optional[int] = None):
+        self.message_id = message_id
+        self.reporter = reporter
+        self.title = title
+        self.jump_url = jump_url
+        self.claimer = claimer
+        self.state = state
+        self.created = created if created is not None else int(time.time())
+        self.updated = updated if updated is not None else self.created
+
+    def to_json(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_json(cls, entry: dict):
+        return cls(**{slot: entry.get(slot) for slot in cls.__slots__})
+
+#Append-only log of ticket records and tracking message layouts, replayed at startup (last line for a key wins)
+class TicketStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.tickets: Dict[int, TicketRecord] = {}
+        #shard index -> (tracking channel, message, ticket ids)
+        self.tracker_shards: Dict[int, typing.Tuple[int, int, typing.List[int]]] = {}
+        #Called with [(record, details), ...] after every write, details hold the ticket text when it's known
+        self.listeners: typing.List[typing.Callable[[typing.List[typing.Tuple[TicketRecord, dict]]], None]] = []
+        self._lines = 0
+
+    def _notify(self, items: typing.List[typing.Tuple[TicketRecord, dict]]):
+        for listener in self.listeners:
+            try:
+                listener(items)
+            except Exception:
+                pCoreLogger.exception("Ticket store listener failed")
+
+    def load(self):
+        self.tickets.clear()
+        self.tracker_shards.clear()
+        self._lines = 0
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    #A crash can leave a half written last line behind
+                    pCoreLogger.warning(f"Skipping corrupt line in {self.path}")
+                    continue
+                self._lines += 1
+                if "shard" in entry:
+                    self.tracker_shards[entry["shard"]] = (entry["channel"], entry["message"], entry["tickets"])
+                else:
+                    record = TicketRecord.from_json(entry)
+                    self.tickets[record.message_id] = record
+        self._compact_if_needed()
+        pCoreLogger.info(f"Loaded {len(self.tickets)} ticket record(s) from {self.path}")
+
+    def _append(self, entry: dict):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self._lines += 1
+        self._compact_if_needed()
+
+    def _compact_if_needed(self):
+        live = len(self.tickets) + len(self.tracker_shards)
+        if self._lines > 4 * live + 1000:
+            self.compact()
+
+    def compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for record in self.tickets.values():
+                f.write(json.dumps(record.to_json(), separators=(",", ":")) + "\n")
+            for shard_index, (channel_id, message_id, ticket_ids) in self.tracker_shards.items():
+                f.write(json.dumps({"shard": shard_index, "channel": channel_id, "message": message_id, "tickets": ticket_ids}, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        self._lines = len(self.tickets) + len(self.tracker_shards)
+
+    def get(self, message_id: int) -> typing.Optional[TicketRecord]:
+        return self.tickets.get(message_id)
+
+    def put(self, record: TicketRecord, **details):
+        self.tickets[record.message_id] = record
+        self._append(record.to_json())
+        self._notify([(record, details)])
+
+    def put_many(self, items: typing.List[typing.Tuple[TicketRecord, dict]]):
+        #One write for the whole batch, used by the backfill
+        with open(self.path, "a") as f:
+            for record, _ in items:
+                self.tickets[record.message_id] = record
+                f.write(json.dumps(record.to_json(), separators=(",", ":")) + "\n")
+        self._lines += len(items)
+        self._compact_if_needed()
+        self._notify(items)
+
+    def update(self, message_id: int, **changes) -> TicketRecord:
+        #Callers changing a ticket's state hold ticket_locks for it, so nothing else changes it between their read and this write
+        record = self.tickets[message_id]
+        for key, value in changes.items():
+            setattr(record, key, value)
+        record.updated = int(time.time())
+        self._append(record.to_json())
+        self._notify([(record, {})])
+        return record
+
+    def shards_for(self, channel_id: int) -> Dict[int, typing.Tuple[int, typing.List[int]]]:
+        #Tracking messages in any other channel are useless after a trackingChannel change
+        return {shard_index: (message_id, ticket_ids) for shard_index, (shard_channel, message_id, ticket_ids) in self.tracker_shards.items() if shard_channel == channel_id}
+
+    def save_shard(self, channel_id: int, shard_index: int, message_id: int, ticket_ids: typing.List[int]):
+        if any(shard_channel != channel_id for shard_channel, _, _ in self.tracker_shards.values()):
+            #First save in a new tracking channel, the old layout is dropped on the next compaction
+            self.tracker_shards = {index: shard for index, shard in self.tracker_shards.items() if shard[0] == channel_id}
+        self.tracker_shards[shard_index] = (channel_id, message_id, ticket_ids)
+        self._append({"shard": shard_index, "channel": channel_id, "message": message_id, "tickets": ticket_ids})
+
+#One lock per ticket message, created on first use and dropped once nobody holds or waits for it
+class TicketLocks:
+    def __init__(self):
+        self._locks: Dict[int, typing.List] = {}
+
+    def __len__(self):
+        return len(self._locks)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, message_id: int):
+        entry = self._locks.get(message_id)
+        if entry is None:
+            entry = self._locks[message_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[message_id]
+
+ticket_locks = TicketLocks()
+
+ticket_store = TicketStore(ticket_store_path)
+ticket_store.load()
+
+#Lock file next to the ticket store, held by the one process allowed to write it (the bot or backfill.py): the store compacts
+#tickets.jsonl from memory and would drop whatever another process appended in the meantime
+class StoreLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            #No flock on Windows, running a single writer is up to whoever runs the bot there
+            return True
+        self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+ticket_store_lock = StoreLock(ticket_store_path + ".lock")
+
+def record_from_message(message: discord.Message) -> typing.Optional[TicketRecord]:
+    #Parse tickets that were sent before the store existed, in the format written by ticket_modal.on_submit
+    if not message.embeds:
+        return None
+    embed = message.embeds[0]
+    if not str(embed.footer.text).isdecimal():
+        return None
+    title = None
+    claimer = None
+    state = "open"
+    for field in embed.fields:
+        if field.name.lower() == "title":
+            title = field.value
+        elif field.name.lower() == "status":
+            for prefix, field_state in (("Claimed by", "claimed"), ("Resolved by", "resolved"), ("Closed by", "closed")):
+                if field.value.startswith(prefix):
+                    state = field_state
+                    mention = re.search(r"<@!?(\d+)>", field.value)
+                    claimer = int(mention.group(1)) if mention else None
+                    break
+    if title is None:
+        return None
+    created = int(embed.timestamp.timestamp()) if embed.timestamp else int(message.created_at.timestamp())
+    return TicketRecord(message.id, int(embed.footer.text), title, message.jump_url, claimer=claimer, state=state, created=created)
+
+def details_from_message(message: discord.Message) -> dict:
+    details = {}
+    for field in message.embeds[0].fields:
+        name = field.name.lower()
+        if name == "description":
+            details["description"] = field.value
+        elif name == "impacted service(s)":
+            details["impacted"] = field.value
+        elif name == "ticket notes":
+            details["notes"] = "" if field.value == "None" else field.value
+    return details
+
+def get_ticket_record(message: discord.Message) -> typing.Optional[TicketRecord]:
+    record = ticket_store.get(message.id)
+    if record is None:
+        record = record_from_message(message)
+        if record is not None:
+            ticket_store.put(record, **details_from_message(message))
+    return record
+
+#SEARCH INDEX
+#SQLite copy of the ticket store plus the ticket text, with an FTS5 table over title/description/notes for /tickets
+class TicketSearchIndex:
+    COLUMNS = ("message_id", "reporter", "claimer", "state", "title", "description", "impacted", "notes", "created", "updated", "jump_url")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tickets (
+                message_id INTEGER PRIMARY KEY, reporter INTEGER, claimer INTEGER, state TEXT, title TEXT,
+                description TEXT DEFAULT '', impacted TEXT DEFAULT '', notes TEXT DEFAULT '',
+                created INTEGER, updated INTEGER, jump_url TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tickets_state_created ON tickets (state, created);
+            CREATE INDEX IF NOT EXISTS tickets_claimer_created ON tickets (claimer, created);
+            CREATE INDEX IF NOT EXISTS tickets_reporter_created ON tickets (reporter, created);
+            CREATE INDEX IF NOT EXISTS tickets_created ON tickets (created);
+            CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(title, description, notes, content='tickets', content_rowid='message_id');
+            CREATE TRIGGER IF NOT EXISTS tickets_ai AFTER INSERT ON tickets BEGIN
+                INSERT INTO tickets_fts (rowid, title, description, notes) VALUES (new.message_id, new.title, new.description, new.notes);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tickets_ad AFTER DELETE ON tickets BEGIN
+                INSERT INTO tickets_fts (tickets_fts, rowid, title, description, notes) VALUES ('delete', old.message_id, old.title, old.description, old.notes);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tickets_au AFTER UPDATE OF title, description, notes ON tickets BEGIN
+                INSERT INTO tickets_fts (tickets_fts, rowid, title, description, notes) VALUES ('delete', old.message_id, old.title, old.description, old.notes);
+                INSERT INTO tickets_fts (rowid, title, description, notes) VALUES (new.message_id, new.title, new.description, new.notes);
+            END;
+        """)
+
+    def upsert_many(self, items: typing.List[typing.Tuple[TicketRecord, dict]]):
+        #Text columns are only overwritten when the caller knows them, state changes don't carry the ticket text
+        rows = [
+            (record.message_id, record.reporter, record.claimer, record.state, record.title, details.get("description"), details.get("impacted"), details.get("notes"), record.created, record.updated, record.jump_url)
+            for record, details in items
+        ]
+        self._db.execute("BEGIN")
+        try:
+            self._db.executemany("""
+                INSERT INTO tickets (message_id, reporter, claimer, state, title, description, impacted, notes, created, updated, jump_url)
+                VALUES (?, ?, ?, ?, ?, COALESCE(?, ''), COALESCE(?, ''), COALESCE(?, ''), ?, ?, ?)
+                ON CONFLICT (message_id) DO UPDATE SET
+                    reporter = excluded.reporter, claimer = excluded.claimer, state = excluded.state, title = excluded.title,
+                    description = COALESCE(?6, description), impacted = COALESCE(?7, impacted), notes = COALESCE(?8, notes),
+                    created = excluded.created, updated = excluded.updated, jump_url = excluded.jump_url
+            """, rows)
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def sync_from(self, store: TicketStore):
+        #Catch up on records written while the index didn't exist or wasn't updated (e.g. a crash between the two writes)
+        latest = self._db.execute("SELECT COALESCE(MAX(updated), 0) FROM tickets").fetchone()[0]
+        known = {row[0] for row in self._db.execute("SELECT message_id FROM tickets")}
+        missing = [(record, {}) for record in store.tickets.values() if record.message_id not in known or record.updated >= latest]
+        if missing:
+            self.upsert_many(missing)
+            pCoreLogger.info(f"Search index caught up on {len(missing)} ticket(s)")
+
+    @staticmethod
+    def _fts_query(text: str) -> str:
+        #Every word has to match, the last one as a prefix so partial words still find something
+        words = re.findall(r"\w+", text)
+        return " ".join(f'"{word}"' for word in words[:-1]) + (f' "{words[-1]}"*' if words else "")
+
+    def query(self, text: str = None, status: str = None, claimer: int = None, reporter: int = None, impacted: str = None, since: int = None, until: int = None, limit: int = 10, offset: int = 0, oldest_first: bool = False) -> typing.Tuple[typing.List[dict], int]:
+        where = []
+        params = []
+        if text and self._fts_query(text):
+            where.append("message_id IN (SELECT rowid FROM tickets_fts WHERE tickets_fts MATCH ?)")
+            params.append(self._fts_query(text))
+        if status == "unresolved":
+            where.append("state IN ('open', 'claimed')")
+        elif status:
+            where.append("state = ?")
+            params.append(status)
+        for column, value in (("claimer", claimer), ("reporter", reporter)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if impacted:
+            where.append("impacted LIKE ? ESCAPE '\\'")
+            params.append("%" + impacted.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+        if since is not None:
+            where.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("created < ?")
+            params.append(until)
+        clause = ("WHERE " + " AND ".join(where)) if where else ""
+        total = self._db.execute(f"SELECT COUNT(*) FROM tickets {clause}", params).fetchone()[0]
+        rows = self._db.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM tickets {clause} ORDER BY created {'ASC' if oldest_first else 'DESC'}, message_id LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows], total
+
+    def close(self):
+        self._db.close()
+
+search_index = TicketSearchIndex(ticket_index_db_path)
+search_index.sync_from(ticket_store)
+ticket_store.listeners.append(search_index.upsert_many)
+
 #COMMAND CLASSES / FUNCTIONS
+@metrics.timed("check_claimed")
 async def check_claimed(interaction: discord.Interaction):
-    old_embed = interaction.message.embeds[0]
-    claimed = False
-    claimed_by = None
-    on_streak = False
-    claimed_by_id = ""
-    for field in old_embed.fields:
-        if field.name.lower() == "status":
-            if "Claimed by" in field.value:
-                claimed = True
-                for _, letter_ in enumerate(field.value):
-                    letter = str(letter_)
-                    if letter.isdecimal():
-                        on_streak = True
-                        claimed_by_id = claimed_by_id + letter
-                    else:
-                        if on_streak:
-                            on_streak = False
-                            break
-                claimed_by = await client.fetch_user(int(claimed_by_id))
-                break
-    if claimed:
-        return True, claimed_by
+    record = get_ticket_record(interaction.message)
+    if record is not None and record.state == "claimed":
+        return True, record.claimer
     else:
         return False
 
 async def get_current_unix():
     return f"<t:{int(time.mktime(datetime.now().timetuple()))}:R>"
 
+def get_bot_avatar():
+    return client.user.avatar.url if not client.user.avatar is None else "https://cdn.discordapp.com/embed/avatars/0.png"
+
+def message_id_from_url(url: str):
+    #Jump urls look like https://discord.com/channels/<guild>/<channel>/<message>
+    last = str(url).rstrip("/").rpartition("/")[2]
+    return int(last) if last.isdecimal() else None
+
+#Discord caps an embed at 25 fields and 6000 characters, the rest is left for the title/description/footer
+TRACKER_MAX_FIELDS = 25
+TRACKER_MAX_CHARS = 5500
+
+#One tracking message and the open tickets listed in it
+class TrackerShard:
+    def __init__(self, message: typing.Optional[discord.Message] = None):
+        self.message = message
+        self.tickets: Dict[int, typing.Tuple[str, str]] = {}
+        self.chars = 0
+
+    def has_room(self, title: str, jump_url: str) -> bool:
+        return len(self.tickets) < TRACKER_MAX_FIELDS and self.chars + len(title) + len(jump_url) <= TRACKER_MAX_CHARS
+
+    def add(self, message_id: int, title: str, jump_url: str):
+        self.remove(message_id)
+        self.tickets[message_id] = (title, jump_url)
+        self.chars += len(title) + len(jump_url)
+
+    def remove(self, message_id: int):
+        entry = self.tickets.pop(message_id, None)
+        if entry is not None:
+            self.chars -= len(entry[0]) + len(entry[1])
+        return entry
+
+#Index of the tracking messages and the open tickets in them, so ticket events don't need to crawl the tracking channel
+#Open tickets are spread over as many tracking messages (shards) as needed and each event only touches one shard
+class TicketIndex:
+    def __init__(self):
+        self.track_channel = None
+        self.shards: typing.List[TrackerShard] = []
+        self.ticket_shard: Dict[int, int] = {}
+        self.built = False
+        self._build_lock = asyncio.Lock()
+
+    @property
+    def open_count(self) -> int:
+        return len(self.ticket_shard)
+
+    def is_open(self, message_id: int) -> bool:
+        return message_id in self.ticket_shard
+
+    def add(self, message_id: int, title: str, jump_url: str) -> int:
+        shard_index = self.ticket_shard.get(message_id)
+        if shard_index is None:
+            for index, shard in enumerate(self.shards):
+                if shard.has_room(title, jump_url):
+                    shard_index = index
+                    break
+            else:
+                #The writer sends the message for a new shard on its next flush
+                self.shards.append(TrackerShard())
+                shard_index = len(self.shards) - 1
+        self.shards[shard_index].add(message_id, title, jump_url)
+        self.ticket_shard[message_id] = shard_index
+        return shard_index
+
+    def remove(self, message_id: int):
+        shard_index = self.ticket_shard.pop(message_id, None)
+        if shard_index is not None:
+            self.shards[shard_index].remove(message_id)
+        return shard_index
+
+    async def build(self):
+        async with self._build_lock:
+            if self.built:
+                return
+            self.shards = []
+            self.ticket_shard.clear()
+            self.track_channel = await channel_cache.get(tracking_channel)
+            stored_shards = ticket_store.shards_for(tracking_channel)
+            if stored_shards:
+                self._build_from_store(stored_shards)
+            else:
+                await self._build_from_history()
+            #Tickets that changed state after the last tracker flush before shutdown, or that were never in this tracking channel
+            for record in ticket_store.tickets.values():
+                if record.state in OPEN_STATES and record.message_id not in self.ticket_shard:
+                    tracker_writer.mark_dirty(self.add(record.message_id, record.title, record.jump_url))
+            self.built = True
+            pCoreLogger.info(f"Ticket index built with {self.open_count} open ticket(s) over {len(self.shards)} tracking message(s)")
+
+    def _build_from_store(self, stored_shards: Dict[int, typing.Tuple[int, typing.List[int]]]):
+        #Partial messages are enough to edit the tracking messages, nothing has to be fetched
+        for shard_index in sorted(stored_shards):
+            message_id, ticket_ids = stored_shards[shard_index]
+            shard = TrackerShard(self.track_channel.get_partial_message(message_id))
+            for ticket_id in ticket_ids:
+                record = ticket_store.get(ticket_id)
+                if record is not None and record.state in OPEN_STATES:
+                    shard.add(ticket_id, record.title, record.jump_url)
+                    self.ticket_shard[ticket_id] = len(self.shards)
+            self.shards.append(shard)
+            if len(shard.tickets) != len(ticket_ids):
+                tracker_writer.mark_dirty(shard_index)
+
+    async def _build_from_history(self):
+        async for message in self.track_channel.history(limit=None, oldest_first=True):
+            if message.author == client.user and message.embeds and str(message.embeds[0].footer.text) == str(client.user.id):
+                shard = TrackerShard(message)
+                for field in message.embeds[0].fields:
+                    message_id = message_id_from_url(field.value)
+                    if message_id is not None and message_id not in self.ticket_shard:
+                        shard.add(message_id, field.name, field.value)
+                        self.ticket_shard[message_id] = len(self.shards)
+                self.shards.append(shard)
+        if not self.shards:
+            self.shards.append(TrackerShard())
+            self.shards[0].message = await self.track_channel.send(embed=self.render(0))
+        for shard_index, shard in enumerate(self.shards):
+            ticket_store.save_shard(self.track_channel.id, shard_index, shard.message.id, list(shard.tickets))
+
+    def render(self, shard_index: int) -> discord.Embed:
+        title = "Bugs not claimed/resolved" if shard_index == 0 else f"Bugs not claimed/resolved (page {shard_index + 1})"
+        embd = discord.Embed(title=title, description="Bugs that are not claimed or not resolved is saved here", color=discord.Color.blue())
+        embd.set_footer(text=str(client.user.id), icon_url=get_bot_avatar())
+        for ticket_title, jump_url in self.shards[shard_index].tickets.values():
+            embd.add_field(name=ticket_title, value=jump_url, inline=False)
+        return embd
+
+ticket_index = TicketIndex()
+
+#Single writer for the tracking messages, ticket events only mark their shard dirty and each dirty shard gets edited once per flush window
+class TrackerWriter:
+    def __init__(self, flush_interval: float = 2.0):
+        self.flush_interval = flush_interval
+        self.ops_received = 0
+        self.edits_made = 0
+        self._dirty: typing.Set[int] = set()
+        self._last_rendered: Dict[int, list] = {}
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+        self._closed = False
+
+    @property
+    def edits_saved(self) -> int:
+        return self.ops_received - self.edits_made
+
+    def mark_dirty(self, shard_index: int):
+        self.ops_received += 1
+        self._dirty.add(shard_index)
+        if self._task is None and not self._closed:
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        while not self._closed:
+            await self._wakeup.wait()
+            #Debounce, everything that lands during this window goes into the same edit
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                pCoreLogger.exception("Failed to update the tracking messages, retrying on next flush")
+                self._wakeup.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty or not ticket_index.built:
+                return
+            dirty = sorted(self._dirty)
+            self._dirty.clear()
+            for position, shard_index in enumerate(dirty):
+                shard = ticket_index.shards[shard_index]
+                rendered = list(shard.tickets.values())
+                if shard.message is not None and rendered == self._last_rendered.get(shard_index):
+                    continue
+                try:
+                    if shard.message is not None:
+                        try:
+                            shard.message = await shard.message.edit(embed=ticket_index.render(shard_index))
+                        except discord.NotFound:
+                            #The tracking message was deleted, post a new one in its place
+                            pCoreLogger.warning(f"Tracking message {shard.message.id} is gone, sending a new one")
+                            shard.message = None
+                    if shard.message is None:
+                        shard.message = await ticket_index.track_channel.send(embed=ticket_index.render(shard_index))
+                except Exception:
+                    self._dirty.update(dirty[position:])
+                    raise
+                self.edits_made += 1
+                self._last_rendered[shard_index] = rendered
+                ticket_store.save_shard(ticket_index.track_channel.id, shard_index, shard.message.id, list(shard.tickets))
+            pCoreLogger.debug(f"Tracker flushed {len(dirty)} shard(s), {self.edits_saved} edit(s) saved so far")
+
+    def reset(self):
+        #Forget what was written, shard indexes mean nothing once the ticket index is rebuilt
+        self._dirty.clear()
+        self._last_rendered.clear()
+
+    async def close(self):
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+tracker_writer = TrackerWriter(flush_interval=tracker_flush_interval)
+
+#Background delivery of reporter DMs, handlers only enqueue and return
+#Notifications for the same user are merged into one DM, failures are retried with backoff and
+#anything that can't be delivered is written to the journal so it survives a restart
+class NotificationOutbox:
+    MAX_DM_LENGTH = 2000
+
+    def __init__(self, journal_path: str, workers: int = 2, max_pending: int = 1000, max_attempts: int = 5, retry_delay: float = 2.0, user_interval: float = 1.0, dm_interval: float = 0.25):
+        self.journal_path = journal_path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.user_interval = user_interval
+        self.dm_interval = dm_interval
+        self.delivered = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.undeliverable = 0
+        #user id -> [messages, attempts], a user is in the queue at most once
+        self._pending: Dict[int, list] = {}
+        self._queue: asyncio.Queue = None
+        #user id -> (timer, messages), the messages are kept so close() can journal them
+        self._retries: Dict[int, typing.Tuple[asyncio.TimerHandle, typing.List[str]]] = {}
+        self._last_sent: typing.OrderedDict[int, float] = OrderedDict()
+        self._next_dm = 0.0
+        self._dm_lock = asyncio.Lock()
+        self._tasks: typing.List[asyncio.Task] = []
+        self._sending: Dict[int, typing.List[str]] = {}
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(entry[0]) for entry in self._pending.values()) + sum(len(messages) for messages in self._sending.values())
+
+    async def drain(self, poll: float = 0.05):
+        while self._pending or self._retries or self._sending:
+            await asyncio.sleep(poll)
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        journal = self._read_journal()
+        #Rewritten first, whatever doesn't fit under max_pending is journaled again by enqueue()
+        self._rewrite_journal(journal)
+        for entry in journal:
+            if entry["status"] == "pending":
+                self.enqueue(entry["user"], entry["text"])
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, user_id: int, text: str) -> bool:
+        entry = self._pending.get(user_id)
+        if entry is not None:
+            if text not in entry[0]:
+                entry[0].append(text)
+                self.coalesced += 1
+            return True
+        if self._queue is None or len(self._pending) >= self.max_pending:
+            #Over capacity (or not started), the next start picks it up from the journal
+            self._journal(user_id, text, "pending")
+            return False
+        self._pending[user_id] = [[text], 0]
+        if user_id not in self._retries:
+            self._queue.put_nowait(user_id)
+        return True
+
+    def _chunks(self, messages: typing.List[str]) -> typing.List[typing.List[str]]:
+        #Groups of messages that fit in one DM, a single message over the limit is cut off when it's sent
+        chunks = []
+        length = 0
+        for text in messages:
+            if chunks and length + len(text) + 2 <= self.MAX_DM_LENGTH:
+                chunks[-1].append(text)
+                length += len(text) + 2
+            else:
+                chunks.append([text])
+                length = len(text)
+        return chunks
+
+    async def _wait_turn(self, user_id: int):
+        async with self._dm_lock:
+            now = time.monotonic()
+            wait = max(self._next_dm - now, self._last_sent.get(user_id, 0.0) + self.user_interval - now, 0.0)
+            self._next_dm = now + wait + self.dm_interval
+        if wait:
+            await asyncio.sleep(wait)
+
+    async def _worker(self):
+        while True:
+            user_id = await self._queue.get()
+            entry = self._pending.pop(user_id, None)
+            if entry is None:
+                continue
+            messages, attempts = entry
+            #Shrinks as chunks go out, so a retry (or close()) only covers what wasn't sent yet
+            unsent = self._sending[user_id] = list(messages)
+            try:
+                user = await user_cache.get(user_id)
+                for chunk in self._chunks(messages):
+                    await self._wait_turn(user_id)
+                    await user.send("\n\n".join(chunk)[:self.MAX_DM_LENGTH])
+                    del unsent[:len(chunk)]
+                    self.delivered += len(chunk)
+                    self._last_sent[user_id] = time.monotonic()
+                    self._last_sent.move_to_end(user_id)
+                    if len(self._last_sent) > 10000:
+                        self._last_sent.popitem(last=False)
+            except (discord.Forbidden, discord.NotFound):
+                #Closed DMs or unknown user, retrying won't help
+                self.undeliverable += len(unsent)
+                for text in unsent:
+                    self._journal(user_id, text, "undeliverable")
+            except Exception:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    pCoreLogger.exception(f"Giving up on DM to {user_id} after {attempts} attempts")
+                    for text in unsent:
+                        self._journal(user_id, text, "pending")
+                else:
+                    self.retried += 1
+                    delay = self.retry_delay * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+                    self._retries[user_id] = (asyncio.get_running_loop().call_later(delay, self._retry, user_id, unsent, attempts), unsent)
+            #Not in a finally, when close() cancels the worker the messages have to stay here for it to journal
+            self._sending.pop(user_id, None)
+
+    def _retry(self, user_id: int, messages: typing.List[str], attempts: int):
+        del self._retries[user_id]
+        entry = self._pending.get(user_id)
+        if entry is not None:
+            #New notifications arrived while waiting, enqueue() left queueing them to this retry
+            entry[0][:0] = [text for text in messages if text not in entry[0]]
+            entry[1] = attempts
+        else:
+            self._pending[user_id] = [messages, attempts]
+        self._queue.put_nowait(user_id)
+
+    def _journal(self, user_id: int, text: str, status: str):
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps({"user": user_id, "text": text, "status": status, "time": int(time.time())}, separators=(",", ":")) + "\n")
+
+    def _read_journal(self) -> typing.List[dict]:
+        if not os.path.isfile(self.journal_path):
+            return []
+        entries = []
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def _rewrite_journal(self, journal: typing.List[dict]):
+        #Pending entries go back into memory, only undeliverable ones stay on disk
+        undeliverable = [entry for entry in journal if entry["status"] == "undeliverable"]
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for entry in undeliverable:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.journal_path)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for handle, _ in self._retries.values():
+            handle.cancel()
+        #Whatever a worker was in the middle of sending may or may not have arrived, better twice than never
+        unsent = list(self._sending.items()) + [(user_id, messages) for user_id, (_, messages) in self._retries.items()] + [(user_id, entry[0]) for user_id, entry in self._pending.items()]
+        for user_id, messages in unsent:
+            for text in messages:
+                self._journal(user_id, text, "pending")
+        self._retries.clear()
+        self._sending.clear()
+        self._pending.clear()
+        self._queue = None
+
+notification_outbox = NotificationOutbox(outbox_journal_path, workers=outbox_workers)
+
+@metrics.timed("track_ticket")
 async def track_ticket(ticket_message: discord.Message, delete: bool=False):
-    track_channel = await client.fetch_channel(tracking_channel)
-    messages = [message async for message in track_channel.history(limit=123)]
-    trackMessage = None
-    found = False
-    for message in messages:
-        if message.author == client.user and str(message.embeds[0].footer.text) == str(client.user.id):
-            trackMessage = message
-            found = True
-            break
-    if not found:
-        embd = discord.Embed(title="Bugs not claimed/resolved", description="Bugs that are not claimed or not resolved is saved here", color=discord.Color.blue())
-        embd.set_footer(text=str(client.user.id), icon_url=client.user.avatar.url)
-        trackMessage = await track_channel.send(embed=embd)
-    
+    if not ticket_index.built:
+        #Warm up builds the index, only build it here if that takes too long
+        await client.wait_warm()
+        await ticket_index.build()
     if delete:
-        trackEmbed = trackMessage.embeds[0]
-        ticketEmbed = ticket_message.embeds[0]
-        ticketTitle = ticketEmbed.fields[1].value
-        fieldsToAdd = []
-        for field in trackEmbed.fields:
-            if not field.name == ticketTitle and not field.value == ticket_message.jump_url:
-                fieldsToAdd.append(field)
-        newTrackEmbed = discord.Embed(title=trackEmbed.title, description=trackEmbed.description, color=discord.Color.blue())
-        newTrackEmbed.set_footer(text=trackEmbed.footer.text, icon_url=client.user.avatar.url)
-        for field_ in fieldsToAdd:
-            newTrackEmbed.add_field(name=field_.name, value=field_.value, inline=False)
-        await trackMessage.edit(embed=newTrackEmbed)
+        shard_index = ticket_index.remove(ticket_message.id)
+        if shard_index is None:
+            return
     else:
-        trackEmbed = trackMessage.embeds[0]
-        ticketEmbed = ticket_message.embeds[0]
-        ticketTitle = ticketEmbed.fields[1].value
-        trackEmbed.add_field(name=ticketTitle, value=ticket_message.jump_url, inline=False)
-        await trackMessage.edit(embed=trackEmbed)
-        
+        record = get_ticket_record(ticket_message)
+        shard_index = ticket_index.add(ticket_message.id, record.title, ticket_message.jump_url)
+    tracker_writer.mark_dirty(shard_index)
+
+#HANDLER PIPELINE
+#Interactions are acknowledged before any REST work, so slow calls can't push a handler past Discord's 3 second window.
+#REST calls then run with their own timeout, except sends and edits that change a ticket (run_mutation), which are never cut off.
+#Failures end up in on_app_command_error, except for the tracker, which is only logged once the ticket change went through (update_tracker).
+class StepFailed(app_commands.AppCommandError):
+    def __init__(self, step: str, original: BaseException):
+        self.step = step
+        self.original = original
+        super().__init__(f"Something went wrong while {step}, please try again later.")
+
+async def run_step(step: str, coro, timeout: float = None):
+    try:
+        return await asyncio.wait_for(coro, timeout if timeout is not None else step_timeout)
+    except app_commands.AppCommandError:
+        raise
+    except Exception as e:
+        raise StepFailed(step, e) from e
+
+async def run_mutation(step: str, coro, interaction: discord.Interaction, timeout: float = None):
+    #Sends and edits are never cancelled, a request that timed out may still land on Discord (usually it's just waiting out a rate limit)
+    #and the ticket state has to match it. Past the timeout the user is told it's still running and the handler goes on once it's done
+    task = asyncio.ensure_future(coro)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout if timeout is not None else step_timeout)
+    except asyncio.TimeoutError:
+        pass
+    except Exception as e:
+        raise StepFailed(step, e) from e
+    try:
+        await interaction.followup.send(f"Discord is slow right now, still {step}...", ephemeral=True)
+    except discord.HTTPException:
+        pass
+    try:
+        return await task
+    except Exception as e:
+        raise StepFailed(step, e) from e
+
+async def update_tracker(ticket_message: discord.Message, delete: bool = False):
+    #Runs after the ticket itself was posted/changed, so a failure here is logged instead of reported: the store already has
+    #the new state and the next index build (done by the next track_ticket if this one didn't finish it) catches the tracker up
+    try:
+        await asyncio.wait_for(track_ticket(ticket_message, delete), step_timeout)
+    except Exception:
+        pCoreLogger.exception(f"Failed to update the tracker for ticket {ticket_message.id}")
+
+def deferred(ephemeral: bool = True):
+    def decorator(func):
+        @wraps(func)
+        async def wrapped(self, interaction: discord.Interaction, *args):
+            if not interaction.response.is_done():
+                await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+            try:
+                return await func(self, interaction, *args)
+            except Exception as e:
+                await on_app_command_error(interaction, e if isinstance(e, app_commands.AppCommandError) else StepFailed("handling this ticket", e))
+        return wrapped
+    return decorator
 
 class ticket_buttons(ui.View):
-    def __init__(self) -> None:
+    #The buttons only depend on the ticket state, every edit gets a fresh view so nothing is shared between tickets
+    def __init__(self, state: str = "open") -> None:
         super().__init__(timeout=None)
-        self.children[1].disabled = True
-        self.children[2].disabled = True
+        self.children[0].disabled = state != "open"
+        self.children[1].disabled = state != "claimed"
+        self.children[2].disabled = state != "claimed"
 
     @discord.ui.button(label="Claim", style=discord.ButtonStyle.blurple, custom_id="claim_btn")
+    @metrics.timed("claim")
+    @deferred()
     async def claim(self, interaction: discord.Interaction, button: discord.Button):
-        data = await check_claimed(interaction)
-        if type(data) is bool:
-            claimed = data
-        else:
-            claimed = data[0]
-        if claimed:
-            return await interaction.response.send_message("This ticket is already claimed!", ephemeral=True)
-        old_embed = interaction.message.embeds[0]
-        embed = discord.Embed(title=old_embed.title, description=old_embed.description, color=discord.Color.blue(), timestamp=old_embed.timestamp)
-        embed.set_author(name=old_embed.author.name, icon_url=old_embed.author.icon_url)
-        embed.set_thumbnail(url=old_embed.thumbnail.url)
-        for field in old_embed.fields:
-            if field.name.lower() == "status":
-                embed.add_field(name=field.name, value=f"Claimed by {interaction.user.mention} at {await get_current_unix()}", inline=False)
-            else:
-                embed.add_field(name=field.name, value=field.value, inline=False)
-        embed.set_footer(icon_url=old_embed.footer.icon_url, text=old_embed.footer.text)
-        button.disabled = True
-        self.children[1].disabled = False
-        self.children[2].disabled = False
-        await interaction.message.edit(embed=embed, view=self)
-        return await interaction.response.send_message("You've claimed this ticket!", ephemeral=True)
+        async with ticket_locks.hold(interaction.message.id):
+            record = get_ticket_record(interaction.message)
+            if record is None or record.state != "open":
+                return await interaction.followup.send("This ticket is already claimed!", ephemeral=True)
+            old_embed = interaction.message.embeds[0]
+            embed = discord.Embed(title=old_embed.title, description=old_embed.description, color=discord.Color.blue(), timestamp=old_embed.timestamp)
+            embed.set_author(name=old_embed.author.name, icon_url=old_embed.author.icon_url)
+            embed.set_thumbnail(url=old_embed.thumbnail.url)
+            for field in old_embed.fields:
+                if field.name.lower() == "status":
+                    embed.add_field(name=field.name, value=f"Claimed by {interaction.user.mention} at {await get_current_unix()}", inline=False)
+                else:
+                    embed.add_field(name=field.name, value=field.value, inline=False)
+            embed.set_footer(icon_url=old_embed.footer.icon_url, text=old_embed.footer.text)
+            await run_mutation("updating the ticket", interaction.message.edit(embed=embed, view=ticket_buttons("claimed")), interaction)
+            ticket_store.update(interaction.message.id, state="claimed", claimer=interaction.user.id)
+        return await interaction.followup.send("You've claimed this ticket!", ephemeral=True)
     
     @discord.ui.button(label="Resolved", style=discord.ButtonStyle.green, custom_id="resolved_btn")
+    @metrics.timed("resolved")
+    @deferred()
     async def resolved(self, interaction: discord.Interaction, button: discord.Button):
-        await interaction.response.defer(ephemeral=True, thinking=True)
-        data = await check_claimed(interaction)
-        if type(data) is bool:
-            claimed = data
-        else:
-            claimed = data[0]
-            claimed_by = data[1]
-        if not claimed:
-            return await interaction.response.send_message("You have to claim this ticket first!", ephemeral=True)
-        else:
-            claimed_by = data[1]
-            if interaction.user == claimed_by:
-                old_embed = interaction.message.embeds[0]
-                embed = discord.Embed(title=old_embed.title, description=old_embed.description, color=discord.Color.green(), timestamp=old_embed.timestamp)
-                embed.set_author(name=old_embed.author.name, icon_url=old_embed.author.icon_url)
-                embed.set_thumbnail(url=old_embed.thumbnail.url)
-                for field in old_embed.fields:
-                    if field.name.lower() == "status":
-                        embed.add_field(name=field.name, value=f"Resolved by {interaction.user.mention} at {await get_current_unix()}", inline=False)
-                    else:
-                        embed.add_field(name=field.name, value=field.value, inline=False)
-                    if field.name.lower() == "title":
-                        title = field.value
-                embed.set_footer(icon_url=old_embed.footer.icon_url, text=old_embed.footer.text)
-                for item in self.children:
-                    item.disabled = True
-                ticketmsg = await interaction.message.edit(embed=embed, view=self)
-                await track_ticket(ticketmsg, True)
-                user = await client.fetch_user(int(old_embed.footer.text))
-                await user.send(f"Your ticket has been marked as resolved!\nTicket title: `{title}`\nResolved At: {await get_current_unix()}")
-                return await interaction.followup.send("Ticket marked as resolved!", ephemeral=True)
-            else:
-                return await interaction.follwoup.send("You can not mark this ticket as resolved since you didn't claim this ticket!", ephemeral=True)
+        async with ticket_locks.hold(interaction.message.id):
+            record = get_ticket_record(interaction.message)
+            if record is None or record.state != "claimed":
+                return await interaction.followup.send("You have to claim this ticket first!", ephemeral=True)
+            if interaction.user.id != record.claimer:
+                return await interaction.followup.send("You can not mark this ticket as resolved since you didn't claim this ticket!", ephemeral=True)
+            old_embed = interaction.message.embeds[0]
+            embed = discord.Embed(title=old_embed.title, description=old_embed.description, color=discord.Color.green(), timestamp=old_embed.timestamp)
+            embed.set_author(name=old_embed.author.name, icon_url=old_embed.author.icon_url)
+            embed.set_thumbnail(url=old_embed.thumbnail.url)
+            for field in old_embed.fields:
+                if field.name.lower() == "status":
+                    embed.add_field(name=field.name, value=f"Resolved by {interaction.user.mention} at {await get_current_unix()}", inline=False)
+                else:
+                    embed.add_field(name=field.name, value=field.value, inline=False)
+            embed.set_footer(icon_url=old_embed.footer.icon_url, text=old_embed.footer.text)
+            await run_mutation("updating the ticket", interaction.message.edit(embed=embed, view=ticket_buttons("resolved")), interaction)
+            record = ticket_store.update(interaction.message.id, state="resolved")
+        notification_outbox.enqueue(record.reporter, f"Your ticket has been marked as resolved!\nTicket title: `{record.title}`\nResolved At: {await get_current_unix()}")
+        #Only once the ticket really is resolved, a failed edit leaves it claimed and tracked
+        await update_tracker(interaction.message, True)
+        return await interaction.followup.send("Ticket marked as resolved!", ephemeral=True)
 
     @discord.ui.button(label="Close", style=discord.ButtonStyle.red, custom_id="close_btn")
+    @metrics.timed("close")
     async def close(self, interaction: discord.Interaction, button: discord.Button):
         data = await check_claimed(interaction)
         if type(data) is bool:
@@ -308,31 +1515,33 @@ class ticket_buttons(ui.View):
             claimed = data[0]
             claimed_by = data[1]
         if claimed:
-            if interaction.user == claimed_by:
-                self_ = self
+            if interaction.user.id == claimed_by:
                 class close_reason_modal(ui.Modal, title="Reason"):
                     reason = ui.TextInput(label="Enter the reason why the ticket was closed:", style=discord.TextStyle.short, required=True, min_length=2, max_length=500, row=0)
 
+                    @metrics.timed("close_submit")
+                    @deferred()
                     async def on_submit(self, interaction: discord.Interaction):
-                        old_embed = interaction.message.embeds[0]
-                        embed = discord.Embed(title=old_embed.title, description=old_embed.description, color=discord.Color.purple(), timestamp=old_embed.timestamp)
-                        embed.set_author(name=old_embed.author.name, icon_url=old_embed.author.icon_url)
-                        embed.set_thumbnail(url=old_embed.thumbnail.url)
-                        for field in old_embed.fields:
-                            if field.name.lower() == "status":
-                                embed.add_field(name=field.name, value=f"Closed by {interaction.user.mention} at {await get_current_unix()}", inline=False)
-                            else:
-                                embed.add_field(name=field.name, value=field.value, inline=False)
-                            if field.name.lower() == "title":
-                                title = field.value
-                        embed.set_footer(icon_url=old_embed.footer.icon_url, text=old_embed.footer.text)
-                        for item in self_.children:
-                            item.disabled = True
-                        ticketmsg = await interaction.message.edit(embed=embed, view=self_)
-                        await track_ticket(ticketmsg, True)
-                        await interaction.response.send_message("Ticket marked as closed!", ephemeral=True)
-                        user = await client.fetch_user(int(old_embed.footer.text))
-                        await user.send(f"Your ticket was closed!\nTicket title: {title}\nReason: `{self.reason}`\nClosed at: {await get_current_unix()}")
+                        async with ticket_locks.hold(interaction.message.id):
+                            #The ticket may have been resolved while the modal was open
+                            record = get_ticket_record(interaction.message)
+                            if record is None or record.state != "claimed" or record.claimer != interaction.user.id:
+                                return await interaction.followup.send("This ticket can't be closed anymore, it was changed while you were typing!", ephemeral=True)
+                            old_embed = interaction.message.embeds[0]
+                            embed = discord.Embed(title=old_embed.title, description=old_embed.description, color=discord.Color.purple(), timestamp=old_embed.timestamp)
+                            embed.set_author(name=old_embed.author.name, icon_url=old_embed.author.icon_url)
+                            embed.set_thumbnail(url=old_embed.thumbnail.url)
+                            for field in old_embed.fields:
+                                if field.name.lower() == "status":
+                                    embed.add_field(name=field.name, value=f"Closed by {interaction.user.mention} at {await get_current_unix()}", inline=False)
+                                else:
+                                    embed.add_field(name=field.name, value=field.value, inline=False)
+                            embed.set_footer(icon_url=old_embed.footer.icon_url, text=old_embed.footer.text)
+                            await run_mutation("updating the ticket", interaction.message.edit(embed=embed, view=ticket_buttons("closed")), interaction)
+                            record = ticket_store.update(interaction.message.id, state="closed")
+                        notification_outbox.enqueue(record.reporter, f"Your ticket was closed!\nTicket title: {record.title}\nReason: `{self.reason}`\nClosed at: {await get_current_unix()}")
+                        await update_tracker(interaction.message, True)
+                        await interaction.followup.send("Ticket marked as closed!", ephemeral=True)
                 await interaction.response.send_modal(close_reason_modal())
             else:
                 return await interaction.response.send_message("You can not mark this ticket as closed since you didn't claim this ticket!", ephemeral=True)
@@ -345,6 +1554,8 @@ class ticket_modal(ui.Modal, title="Bug report"):
     impacted = ui.TextInput(label="What part of our/other service is impacted?", style=discord.TextStyle.short, required=True, row=2, max_length=400, min_length=2, placeholder="pro-tonn host, pro-tonn bot, pro-tonn activities, others...")
     notes = ui.TextInput(label="Notes for developers", style=discord.TextStyle.long, required=False, row=3, max_length=400)
 
+    @metrics.timed("modal_submit")
+    @deferred()
     async def on_submit(self, interaction: discord.Interaction):
         embed = discord.Embed(title="Bug report", description="A bug report has been submitted", color=discord.Color.red(), timestamp=datetime.now())
         embed.set_author(name="Pro-tonn Ticket", icon_url=client.user.avatar.url if not client.user.avatar is None else "https://cdn.discordapp.com/embed/avatars/0.png")
@@ -356,10 +1567,10 @@ class ticket_modal(ui.Modal, title="Bug report"):
         embed.add_field(name="Ticket Notes", value=self.notes if not str(self.notes).replace(" ", "") == "" else "None", inline=False)
         embed.add_field(name="Status", value="Waiting to be claimed/closed", inline=False)
         embed.set_footer(icon_url=client.user.avatar.url if not client.user.avatar is None else "https://cdn.discordapp.com/embed/avatars/0.png", text=str(interaction.user.id))
-        channel = await client.fetch_channel(main_channel)
-        ticketMsg = await channel.send(embed=embed, view=ticket_buttons())
-        await track_ticket(ticketMsg)
-        await interaction.response.send_message("Your feedback was sent to the developers!", ephemeral=True)
+        channel = await run_step("finding the ticket channel", channel_cache.get(main_channel))
+        ticketMsg = await run_mutation("posting your ticket", channel.send(embed=embed, view=ticket_buttons()), interaction)
+        ticket_store.put(TicketRecord(ticketMsg.id, interaction.user.id, str(self.title_), ticketMsg.jump_url), description=str(self.bug), impacted=str(self.impacted), notes=str(self.notes))
+        await asyncio.gather(update_tracker(ticketMsg), run_step("confirming your ticket", interaction.followup.send("Your feedback was sent to the developers!", ephemeral=True)))
 
 @tree.command(guild=discord.Object(id=main_guild), name="ticket", description="Open a ticket for bug report")
 @RateLimit(times=1, seconds=180, ephemeral=True, ignoreManageGuildPermission=True)
@@ -367,27 +1578,141 @@ async def ticket_bug_report(interaction: discord.Interaction):
     await interaction.response.send_modal(ticket_modal())
 
 @tree.command(guild=discord.Object(id=main_guild), name="restart", description="(Admin Only) Restart the bot")
+@app_commands.describe(mode="full restarts the process, reload reloads data.json and ticket state without reconnecting")
+@app_commands.choices(mode=[app_commands.Choice(name="full", value="full"), app_commands.Choice(name="reload", value="reload")])
 @app_commands.checks.has_permissions(manage_guild=True)
-async def restart_bot(interaction: discord.Interaction):
-    embed = discord.Embed(title="Restarting bot", description="Bot is currently restarting, this process will take up to a minute!", color=discord.Color.blue())
+async def restart_bot(interaction: discord.Interaction, mode: app_commands.Choice[str] = None):
+    reload = mode is not None and mode.value == "reload"
+    embed = discord.Embed(title="Reloading bot" if reload else "Restarting bot", description="Bot is currently reloading, this only takes a few seconds!" if reload else "Bot is currently restarting, this process will take up to a minute!", color=discord.Color.blue())
     embed.set_author(name=interaction.user.name, icon_url=interaction.user.avatar.url if not interaction.user.avatar is None else "https://cdn.discordapp.com/embed/avatars/0.png")
-    embed.add_field(name="Restart info", value=f"\n**Executable:** `{sys.executable}`\n\n**Args:** `{sys.argv}`", inline=True)
+    embed.add_field(name="Restart info", value=f"\n**Executable:** `{sys.executable}`\n\n**Args:** `{sys.argv}`\n\n**Mode:** `{'reload' if reload else 'full'}`", inline=True)
     embed.set_footer(icon_url=client.user.avatar.url if not client.user.avatar is None else "https://cdn.discordapp.com/embed/avatars/0.png", text="Pro-tonn bug report")
     await interaction.response.send_message(embed=embed)
+    if reload:
+        pCoreLogger.info(f"Reloading bot(Issued by {interaction.user.name})...")
+        start = time.perf_counter()
+        needs_restart = await reload_state()
+        note = f"\n`{'`, `'.join(needs_restart)}` changed too, those need a full restart." if needs_restart else ""
+        return await interaction.followup.send(f"Reloaded in `{time.perf_counter() - start:.2f}s`!{note}", ephemeral=True)
     pCoreLogger.info(f"Restarting bot(Issued by {interaction.user.name})...")
+    #execv replaces the process without running close(), journal the outbox and flush everything else first
+    await client.close_state()
     return os.execv(sys.executable, ['python'] + sys.argv)
 
+@tree.command(guild=discord.Object(id=main_guild), name="metrics", description="(Admin Only) Show bot performance metrics")
+@app_commands.checks.has_permissions(manage_guild=True)
+async def show_metrics(interaction: discord.Interaction):
+    if not metrics.enabled:
+        return await interaction.response.send_message("Metrics are disabled (`metricsEnabled` in data.json).", ephemeral=True)
+    embed = discord.Embed(title="Bot metrics", color=discord.Color.blue())
+    timings = []
+    for name, entry in sorted(metrics.timings.items()):
+        count = sum(entry[:-2])
+        timings.append(f"**{name}**: {count}x, avg `{entry[-2] / count * 1000:.1f}ms`, max `{entry[-1] * 1000:.1f}ms`")
+    embed.add_field(name="Handlers", value="\n".join(timings) or "No calls yet", inline=False)
+    rest = [f"`{route}`: {count}" for route, count in metrics.rest_calls.most_common(10)]
+    embed.add_field(name=f"REST calls ({sum(metrics.rest_calls.values())} total)", value="\n".join(rest) or "None yet", inline=False)
+    rejections = [f"`{command}`: {count}" for command, count in metrics.rate_limit_rejections.items()]
+    embed.add_field(name="Rate limit rejections", value="\n".join(rejections) or "None", inline=False)
+    embed.add_field(name="Gateway latency", value=f"`{client.latency * 1000:.0f}ms`" if math.isfinite(client.latency) else "Not connected", inline=True)
+    embed.add_field(name="Tracker edits saved", value=f"`{tracker_writer.edits_saved}`", inline=True)
+    embed.set_footer(icon_url=get_bot_avatar(), text="Pro-tonn bug report")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+class ticket_results(ui.View):
+    PAGE_SIZE = 10
+
+    def __init__(self, owner_id: int, title: str, filters: dict):
+        super().__init__(timeout=300)
+        self.owner_id = owner_id
+        self.title = title
+        self.filters = filters
+        self.page = 0
+
+    def render(self) -> discord.Embed:
+        rows, total = search_index.query(**self.filters, limit=self.PAGE_SIZE, offset=self.page * self.PAGE_SIZE)
+        pages = max(1, math.ceil(total / self.PAGE_SIZE))
+        embed = discord.Embed(title=self.title, description=f"{total} ticket(s) found" if total else "No tickets found", color=discord.Color.blue())
+        for row in rows:
+            status = row["state"].capitalize() + (f" by <@{row['claimer']}>" if row["claimer"] else "")
+            excerpt = row["description"][:80] + ("..." if len(row["description"]) > 80 else "")
+            embed.add_field(name=f"{row['title']} ({row['state']})", value=f"{excerpt}\n**Reporter:** <@{row['reporter']}> | **Status:** {status} | <t:{row['created']}:R>\n{row['jump_url']}", inline=False)
+        embed.set_footer(icon_url=get_bot_avatar(), text=f"Page {self.page + 1}/{pages}")
+        self.children[0].disabled = self.page == 0
+        self.children[1].disabled = self.page + 1 >= pages
+        return embed
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("These aren't your search results!", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.gray)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.Button):
+        self.page -= 1
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next_page(self, interaction: discord.Interaction, button: discord.Button):
+        self.page += 1
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+def parse_date(value: str, end: bool = False) -> typing.Optional[int]:
+    if value is None:
+        return None
+    try:
+        date = datetime.strptime(value.strip(), "%Y-%m-%d")
+    except ValueError:
+        raise app_commands.AppCommandError(f"`{value}` isn't a valid date, use YYYY-MM-DD.")
+    #The end date is inclusive
+    return int(date.timestamp()) + (86400 if end else 0)
+
+tickets_group = app_commands.Group(name="tickets", description="Search bug report tickets")
+
+@tickets_group.command(name="search", description="Search tickets by text, status, people, service and date")
+@app_commands.describe(query="Words to look for in the title, description and notes", status="Ticket status", claimer="Who claimed the ticket", reporter="Who reported the ticket", service="Impacted service contains this", since="Submitted on or after (YYYY-MM-DD)", until="Submitted on or before (YYYY-MM-DD)")
+@app_commands.choices(status=[app_commands.Choice(name=name, value=name.lower()) for name in ("Unresolved", "Open", "Claimed", "Resolved", "Closed")])
+@app_commands.checks.has_permissions(manage_messages=True)
+async def tickets_search(interaction: discord.Interaction, query: str = None, status: app_commands.Choice[str] = None, claimer: discord.User = None, reporter: discord.User = None, service: str = None, since: str = None, until: str = None):
+    filters = {
+        "text": query,
+        "status": status.value if status else None,
+        "claimer": claimer.id if claimer else None,
+        "reporter": reporter.id if reporter else None,
+        "impacted": service,
+        "since": parse_date(since),
+        "until": parse_date(until, end=True),
+    }
+    view = ticket_results(interaction.user.id, "Ticket search", filters)
+    await interaction.response.send_message(embed=view.render(), view=view, ephemeral=True)
+
+@tickets_group.command(name="backlog", description="List unresolved tickets, oldest first")
+@app_commands.checks.has_permissions(manage_messages=True)
+async def tickets_backlog(interaction: discord.Interaction):
+    view = ticket_results(interaction.user.id, "Ticket backlog", {"status": "unresolved", "oldest_first": True})
+    await interaction.response.send_message(embed=view.render(), view=view, ephemeral=True)
+
+tree.add_command(tickets_group, guild=discord.Object(id=main_guild))
+
 @tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    if isinstance(error, StepFailed):
+        pCoreLogger.error(f"Interaction failed while {error.step}", exc_info=error.original)
+    #Deferred handlers already used up the initial response
+    send = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
     if isinstance(error, app_commands.CommandOnCooldown):
-        return await interaction.response.send_message(error, ephemeral=True)
+        return await send(error, ephemeral=True)
     else:
-        return await interaction.response.send_message(error, ephemeral=True)
+        return await send(error, ephemeral=True)
 
 pCoreLogger.info("Functions intitialized")
 pCoreLogger.info("Trying to log in with token...")
 
 async def main():
+    if not ticket_store_lock.acquire():
+        pCoreLogger.critical(f"{ticket_store_path} is in use by another bot process or a backfill, a second bot needs its own data directory")
+        return
     await client.start(os.getenv("TOKEN"))
 
 if __name__ == "__main__":